@@ -1,10 +1,12 @@
 import os
 import logging
+import asyncio
 import json
+import time
 
-from gym.common.process import Actuator
+from gym.common.process import AsyncActuator
 from gym.common.entity import Component
-from gym.common.messages import Evaluation, Snapshot, Error
+from gym.common.messages import Evaluation, Snapshot, Error, Ready
 
 logger = logging.getLogger(__name__)
 
@@ -14,14 +16,26 @@ class Agent(Component):
     FILES_PREFIX = 'prober_'
     FILES_SUFFIX = 'py'
     CLASS_PREFIX = 'Prober'
+    EXECUTION = 'pool'
+    CACHE = '/tmp/gym-agent-probers.json'
+    # socket state of a listening server: TCP_LISTEN, or TCP_CLOSE for a bound udp socket
+    PROC_NET = {
+        '/proc/net/tcp': '0A',
+        '/proc/net/tcp6': '0A',
+        '/proc/net/udp': '07',
+        '/proc/net/udp6': '07',
+    }
+    LISTEN_TIMEOUT = 10
+    RELEASE_TIMEOUT = 60
 
     def __init__(self, info, in_q, out_q):
         Component.__init__(self, "agent", in_q, out_q, info)
-        self.actuator = Actuator()
-        self.cfg_acts()
+        self.actuator = AsyncActuator()
+        self._releases = {}
+        self.cfg_acts(info)
         logger.info("Agent Started: id %s - url %s", info.get("id"), info.get("url"))
 
-    def cfg_acts(self):
+    def cfg_acts(self, info=None):
         logger.info("Loading Probers")
         folder = os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
@@ -32,7 +46,14 @@ class Agent(Component):
             "prefix": Agent.FILES_PREFIX,
             "sufix": Agent.FILES_SUFFIX,
             "full_path": True,
+            "class_prefix": Agent.CLASS_PREFIX,
+            "cache": Agent.CACHE,
+            "execution": Agent.EXECUTION,
         }
+        # execution (pool or process), workers and deadline can be set in the cfg file
+        for key in ["execution", "workers", "deadline", "output_size"]:
+            if info and info.get(key) is not None:
+                cfg[key] = info.get(key)
         self.actuator.cfg(cfg)
 
     def origin(self):
@@ -77,9 +98,81 @@ class Agent(Component):
     def instruction(self, msg):
         logger.info('Instruction')
         logger.debug(msg.to_json())
-        evals = self.actuator.act(msg)
+        self.spawn(self.execute(msg))
+
+    def listening_ports(self):
+        ports = set()
+        for path, state in Agent.PROC_NET.items():
+            try:
+                with open(path) as f:
+                    next(f)
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) > 3 and fields[3] == state:
+                            ports.add(int(fields[1].split(':')[-1], 16))
+            except (OSError, StopIteration):
+                continue
+        return ports
+
+    async def wait_listening(self, ports):
+        if not any(os.path.exists(path) for path in Agent.PROC_NET):
+            await asyncio.sleep(1)
+            return False
+        deadline = time.monotonic() + Agent.LISTEN_TIMEOUT
+        while time.monotonic() < deadline:
+            if set(ports) <= self.listening_ports():
+                return True
+            await asyncio.sleep(0.01)
+        logger.info("Ports %s not listening after %s s", ports, Agent.LISTEN_TIMEOUT)
+        return False
+
+    async def barrier(self, msg, ports):
+        start = time.monotonic()
+        key = (msg.get_prefix(), msg.get_id())
+        release = asyncio.Event()
+        self._releases[key] = release
+        if ports:
+            await self.wait_listening(ports)
+        listened = time.monotonic()
+
+        ready = Ready(id=msg.get_id())
+        ready.set('ports', ports)
+        ready.to(None, prefix=msg.get_prefix())
+        self.stamp_output(msg, ready)
+        self.exit([ready])
+
+        try:
+            await asyncio.wait_for(release.wait(), Agent.RELEASE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.info("Barrier not released after %s s - starting anyway", Agent.RELEASE_TIMEOUT)
+        finally:
+            del self._releases[key]
+        logger.info("Barrier timings: listening %.3f s - released %.3f s",
+                    listened - start, time.monotonic() - listened)
+
+    def release(self, msg):
+        logger.info('Release')
+        key = (msg.get_prefix(), msg.get_id())
+        release = self._releases.get(key, None)
+        if release:
+            release.set()
+        else:
+            logger.debug("No barrier waiting for release %s", key)
+
+    async def execute(self, msg):
+        barrier = None
+        if msg.get('barrier'):
+            barrier = lambda ports: self.barrier(msg, ports)
+        try:
+            evals = await self.actuator.act(msg, barrier=barrier)
+        except Exception as e:
+            logger.debug("Exception on instruction execution: %s", e)
+            logger.exception(e)
+            # the manager still waits for this snapshot to complete the trial
+            evals = self.actuator.failed(msg, 'ERROR: instruction execution failed: %s' % e)
         evaluations = self.evaluations(evals)
         snap = self.snapshot(msg.get('id'), evaluations)
+        snap.set('trial', msg.get('trial'))
         snap.to(None, prefix=msg.get_prefix())
         self.stamp_output(msg, snap)
         outputs = [snap]
@@ -89,12 +182,14 @@ class Agent(Component):
         logger.info("Agent Profile - Probers")
         probers = self.actuator.get_acts()
         logger.debug(probers)
-        profile = {'probers': probers}
+        profile = {'probers': probers, 'barrier': True}
         return profile
 
     def _handle(self, msg):
         what = msg.get_type()
         if what == 'instruction':
             self.instruction(msg)
+        elif what == 'release':
+            self.release(msg)
         else:
             logger.debug('unknown msg-type %s', what)
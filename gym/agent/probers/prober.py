@@ -2,9 +2,10 @@ import logging
 import json
 import argparse
 import subprocess
-import time
 from datetime import datetime
 
+from gym.common.capture import Capture
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,7 +13,8 @@ class Processor:
     def __init__(self):
         self.process = None
 
-    def start_process(self, args, stop=False, timeout=60):
+    def start_process(self, args, stop=False, timeout=60, consumer=None, size=None):
+        capture = Capture(consumer, size)
         try:
             p = subprocess.Popen(args,
                 stdin = subprocess.PIPE,
@@ -21,30 +23,33 @@ class Processor:
                 )
             self.process = p
             logger.info('process started %s', p.pid)
+            capture.start(p)
             if stop:
                 if self.stop_process(timeout):
-                    out, err = p.communicate()
+                    p.wait()
+                    out, err = capture.join()
                     return (p.returncode, out, err)
                 else:
                     self.process = None
                     return (-1, None, None)
             else:
-                out, err = p.communicate()
+                p.wait()
+                out, err = capture.join()
                 logger.info('process stopped %s', self.process.pid)
                 self.process = None
                 return (p.returncode, out, err)
-        except OSError:
+        except OSError as e:
+            logger.info('process could not start %s', e)
             self.process = None
-            return (-1, None, None)
+            return (-1, None, str(e).encode('UTF-8'))
 
     def stop_process(self, timeout):
-        # import ast
-        # timeout = float(ast.literal_eval(timeout))
         logger.info('stopping process after %s', timeout)
         if self.process:
-            #if process stop, usually server, so waits one second more
-            time.sleep(timeout)
-            self.process.kill()
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
             logger.info('process stopped %s', self.process.pid)
             self.process = None
             return True
@@ -74,8 +79,8 @@ class Launcher:
                                         action="store_true",
                                         required=False)
 
-    def parse_args(self):
-        self._settings = self.parser.parse_args()
+    def parse_args(self, argv=None):
+        self._settings = self.parser.parse_args(argv)
         return self._settings
 
 
@@ -99,6 +104,13 @@ class Prober:
         self._parameters = dict(list(self.parameters.items()) + list(self._default_params.items()))
         self._launcher = Launcher(parameters=parameters, default=self._default_params)
         self._processor = Processor()
+        self._output_size = None
+
+    def feed(self, line):
+        pass
+
+    def listening(self, parameters):
+        return None
 
     def options(self, opts):
         raise NotImplementedError
@@ -157,11 +169,13 @@ class Prober:
         self._call = " ".join(cmd)
 
         self._tstart = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-        ret, out, err = self._processor.start_process(cmd, stop, timeout)
+        ret, out, err = self._processor.start_process(cmd, stop, timeout,
+                                                      consumer=self.feed,
+                                                      size=self._output_size)
         self._tstop = datetime.now().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
-        output = out.decode('UTF-8')
-        error = err.decode('UTF-8')
+        output = out.decode('UTF-8') if out else ''
+        error = err.decode('UTF-8') if err else ''
         
         if ret == 0:
             logger.info("process executed %s", ret)
@@ -182,8 +196,8 @@ class Prober:
     def to_json(self, value):
         return json.dumps(value, sort_keys=True, indent=4)
 
-    def main(self):
-        settings = self._launcher.parse_args()
+    def main(self, argv=None):
+        settings = self._launcher.parse_args(argv)
         self.probe(settings)
         output = self.to_json(self._output)
         return output
\ No newline at end of file
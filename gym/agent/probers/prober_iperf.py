@@ -1,5 +1,4 @@
 import logging
-import time
 from gym.common.defs.tools import PROBER_IPERF
 from gym.agent.probers.prober import Prober
 
@@ -19,19 +18,25 @@ class ProberIperf(Prober):
         'bandwidth',
     ]
 
+    # upper bound a server waits for its client beyond the test duration
+    SERVER_GRACE = 10
+
     def __init__(self):
         Prober.__init__(self, id=PROBER_IPERF, name="iperf",
                         parameters=ProberIperf.PARAMETERS,
                         metrics=ProberIperf.METRICS)
         self._command = 'iperf'
 
+    def listening(self, parameters):
+        if parameters.get('server', None):
+            return int(parameters.get('port', 5001))
+        return None
+
     def options(self, opts):
         options = self.serialize(opts)
         opts = []
         stop = False
         timeout = 0
-        if '-c' in options:
-            time.sleep(0.5)
         for k,v in options.items():
             if k == '-s':
                 stop = True
@@ -41,6 +46,10 @@ class ProberIperf(Prober):
                 opts.extend([k])
             else:
                 opts.extend([k,v])
+        if stop:
+            # server exits after serving its single client
+            opts.extend(['-P', '1'])
+            timeout += ProberIperf.SERVER_GRACE
         opts.extend(['-f','m'])
         return opts, stop, timeout
 
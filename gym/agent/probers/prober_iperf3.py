@@ -1,5 +1,4 @@
 import logging
-import time
 import json
 from gym.common.defs.tools import PROBER_IPERF3
 from gym.agent.probers.prober import Prober
@@ -14,11 +13,48 @@ class ProberIperf3(Prober):
         'protocol':'-u',
         'server':'-s',
         'client':'-c',
-        'rate':'-b'
+        'rate':'-b',
+        'parallel':'-P',
+        'reverse':'-R',
+        'bidir':'--bidir',
+        'window':'-w',
+        'mss':'-M',
+        'zerocopy':'-Z',
     }
 
+    FLAGS = ['-R', '--bidir', '-Z']
+
+    # upper bound a server waits for its client beyond the test duration
+    SERVER_GRACE = 10
+
     METRICS = [
         'bandwidth',
+        'bits_per_second',
+        'bytes',
+        'retransmits',
+        'jitter_ms',
+        'lost_packets',
+        'lost_percent',
+        'packets',
+        'received_bits_per_second',
+        'reverse_bits_per_second',
+        'reverse_bytes',
+        'reverse_retransmits',
+        'reverse_jitter_ms',
+        'reverse_lost_packets',
+        'reverse_lost_percent',
+        'reverse_packets',
+        'cpu_host_total',
+        'cpu_host_user',
+        'cpu_host_system',
+        'cpu_remote_total',
+        'cpu_remote_user',
+        'cpu_remote_system',
+        'interval_bits_per_second',
+        'interval_retransmits',
+        'interval_snd_cwnd',
+        'interval_reverse_bits_per_second',
+        'interval_reverse_retransmits',
     ]
 
     def __init__(self):
@@ -28,6 +64,14 @@ class ProberIperf3(Prober):
         self._command = 'iperf3'
         self._server = False
 
+    def is_server(self, client):
+        return not client or client == 'false' or client == 'False'
+
+    def listening(self, parameters):
+        if self.is_server(parameters.get('client', False)):
+            return int(parameters.get('port', 9030))
+        return None
+
     def options(self, opts):
         options = self.serialize(opts)
         opts = []
@@ -43,10 +87,10 @@ class ProberIperf3(Prober):
         
         if server:
             opts.extend( ['-c', server] )                
-            time.sleep(1)
 
-        if not client or client == 'false' or client == 'False':
-            opts.extend( ['-s'] )                
+        if self.is_server(client):
+            # one-off server, exits as soon as the client test finishes
+            opts.extend( ['-s', '-1'] )
             stop = True
             self._server = True
         
@@ -59,7 +103,7 @@ class ProberIperf3(Prober):
             timeout = 0
         
         if stop:
-            timeout += 2
+            timeout += ProberIperf3.SERVER_GRACE
 
         proto = options.get('-u', None)
         if proto == 'udp':
@@ -69,87 +113,126 @@ class ProberIperf3(Prober):
         rate = options.get('-b', None)
         if rate and not stop:
             opts.extend( ['-b', rate] )
-            
+
+        if not stop:
+            for opt in ['-P', '-w', '-M']:
+                value = options.get(opt, None)
+                if value:
+                    opts.extend( [opt, value] )
+
+            for flag in ProberIperf3.FLAGS:
+                value = options.get(flag, False)
+                if value and value != 'false' and value != 'False':
+                    opts.append(flag)
+
         opts.extend(['-f','m'])
         opts.append('-J')
         return opts, stop, timeout
 
+    def metric(self, name, value, unit, type="float", series=False):
+        m = {
+            "name": name,
+            "series": series,
+            "type": type,
+            "unit": unit,
+            "value": value,
+        }
+        return m
+
+    def summary(self, values, prefix=""):
+        metrics = []
+        fields = [
+            ("bits_per_second", "bits_per_second", float),
+            ("bytes", "bytes", int),
+            ("retransmits", "retransmits", int),
+            ("jitter_ms", "ms", float),
+            ("lost_packets", "packets", int),
+            ("lost_percent", "%", float),
+            ("packets", "packets", int),
+        ]
+        for field, unit, cast in fields:
+            value = values.get(field, None)
+            if value is not None:
+                m = self.metric(prefix + field, cast(value), unit, type=cast.__name__)
+                metrics.append(m)
+        return metrics
+
+    def cpu(self, end):
+        metrics = []
+        cpu = end.get("cpu_utilization_percent", {})
+        for field, value in cpu.items():
+            m = self.metric("cpu_" + field, float(value), "%")
+            metrics.append(m)
+        return metrics
+
+    def intervals(self, intervals, key="sum", prefix="interval_"):
+        sums = [interval.get(key) for interval in intervals if interval.get(key)]
+        if not sums or len(sums) != len(intervals):
+            return []
+
+        metrics = []
+        bps = [float(s.get("bits_per_second", 0)) for s in sums]
+        metrics.append(self.metric(prefix + "bits_per_second", bps, "bits_per_second", series=True))
+
+        if all("retransmits" in s for s in sums):
+            retransmits = [int(s.get("retransmits")) for s in sums]
+            metrics.append(self.metric(prefix + "retransmits", retransmits, "retransmits",
+                                       type="int", series=True))
+
+        if key == "sum":
+            # cwnd is only reported per stream, so the total over the parallel streams is used
+            streams = [[st for st in interval.get("streams", []) if st.get("sender", True)]
+                       for interval in intervals]
+            if all(streams) and all("snd_cwnd" in st for sts in streams for st in sts):
+                cwnd = [sum(int(st.get("snd_cwnd")) for st in sts) for sts in streams]
+                metrics.append(self.metric(prefix + "snd_cwnd", cwnd, "bytes",
+                                           type="int", series=True))
+        return metrics
+
     def parser(self, out):
         _eval = []
         try:
             out = json.loads(out)
         except ValueError:
             logger.debug('iperf3 json output could not be decoded')
-            out = {}
+            return _eval
+
+        end = out.get("end", None)
+        if not end or self._server:
+            return _eval
+
+        if 'sum_sent' in end:
+            _values = end.get('sum_sent')
+        elif 'sum' in end:
+            _values = end.get('sum')
         else:
-            end = out.get("end", None)
-            
-            if end:
-                if 'sum_sent' in end:
-                    _values = end.get('sum_sent')
-                elif 'sum' in end:
-                    _values = end.get('sum')
-                else:
-                    _values = {}
-
-                if not self._server and _values:
-            
-                    m1 = {
-                        "name": "bits_per_second",
-                        "series": False,
-                        "type": "float",
-                        "unit": "bits_per_second",
-                        "value": float(_values.get("bits_per_second")),
-                    }
-
-                    m2 = {
-                        "name": "jitter_ms",
-                        "series": False,
-                        "type": "float",
-                        "unit": "ms",
-                        "value": float(_values.get("jitter_ms")),
-                    }
-
-                    m3 = {
-                        "name": "bytes",
-                        "series": False,
-                        "type": "int",
-                        "unit": "bytes",
-                        "value": int(_values.get("bytes")),
-                    }
-
-
-                    m4 = {
-                        "name": "lost_packets",
-                        "series": False,
-                        "type": "int",
-                        "unit": "packets",
-                        "value": int(_values.get("lost_packets")),
-                    }
-
-                    m5 = {
-                        "name": "lost_percent",
-                        "series": False,
-                        "type": "float",
-                        "unit": "%",
-                        "value": float(_values.get("lost_percent")),
-                    }
-
-                    m6 = {
-                        "name": "packets",
-                        "series": False,
-                        "type": "int",
-                        "unit": "packets",
-                        "value": int(_values.get("packets")),
-                    }
-
-
-                    _eval = [m1, m2, m3, m4, m5, m6]
-                    
-
-        finally:
+            _values = {}
+
+        if not _values:
             return _eval
 
+        _eval.extend(self.summary(_values))
+
+        received = end.get('sum_received', None)
+        if received and 'bits_per_second' in received:
+            m = self.metric("received_bits_per_second", float(received.get("bits_per_second")),
+                            "bits_per_second")
+            _eval.append(m)
+
+        reverse = end.get('sum_sent_bidir_reverse', None)
+        if reverse:
+            _eval.extend(self.summary(reverse, prefix="reverse_"))
+
+        _eval.extend(self.cpu(end))
+
+        intervals = out.get("intervals", [])
+        if intervals:
+            _eval.extend(self.intervals(intervals))
+            _eval.extend(self.intervals(intervals, key="sum_bidir_reverse",
+                                        prefix="interval_reverse_"))
+
+        return _eval
+
 
 if __name__ == '__main__':
     app = ProberIperf3()
@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 # coding=utf-8
 
+import re
 import logging
+from array import array
 from gym.agent.probers.prober import Prober
 from gym.common.defs.tools import PROBER_PING
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,18 +22,96 @@ class ProberPing(Prober):
         'packets':'-c',
         'frame_size':'-s',
         'target':'target',
+        'series_max':'series_max',
     }
 
     METRICS = [
         'latency',
-        'frame_loss'
+        'frame_loss',
+        'rtt_min',
+        'rtt_avg',
+        'rtt_max',
+        'rtt_mdev',
+        'rtt_p50',
+        'rtt_p90',
+        'rtt_p99',
+        'rtt_p999',
+        'rtt',
+    ]
+
+    PERCENTILES = [
+        ('p50', 50.0),
+        ('p90', 90.0),
+        ('p99', 99.0),
+        ('p999', 99.9),
     ]
 
+    # rtt series longer than this are evenly downsampled
+    SERIES_MAX = 10000
+
+    # per packet lines, e.g. "64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time=0.045 ms"
+    REPLY = re.compile(r'seq=(\d+) .*time[=<]([\d.,]+) ?(\w*)')
+
     def __init__(self):
         Prober.__init__(self, id=PROBER_PING, name="ping",
                         parameters=ProberPing.PARAMETERS,
                         metrics=ProberPing.METRICS)
         self._command = 'ping'
+        # only the summary lines are parsed from the raw output
+        self._output_size = 64 * 1024
+        self._rtts = array('d')
+        self._rtt_units = 'ms'
+        self._series_max = ProberPing.SERIES_MAX
+
+    def feed(self, line):
+        match = ProberPing.REPLY.search(line)
+        if match:
+            self._rtts.append(float(match.group(2).replace(",", ".")))
+            if match.group(3):
+                self._rtt_units = match.group(3)
+
+    def percentile(self, values, q):
+        pos = (len(values) - 1) * q / 100.0
+        low = int(pos)
+        high = min(low + 1, len(values) - 1)
+        return values[low] + (values[high] - values[low]) * (pos - low)
+
+    def percentiles(self):
+        qs = [q for _, q in ProberPing.PERCENTILES]
+        if numpy is not None:
+            # computed over the rtts buffer, without a list of python floats
+            values = numpy.frombuffer(self._rtts, dtype=numpy.float64)
+            return [float(value) for value in numpy.percentile(values, qs)]
+        values = sorted(self._rtts)
+        return [self.percentile(values, q) for q in qs]
+
+    def sampled(self):
+        step = -(-len(self._rtts) // self._series_max) if self._series_max > 0 else 1
+        return self._rtts[::step].tolist()
+
+    def series(self):
+        metrics = []
+        if self._rtts:
+            percentiles = self.percentiles()
+            for (name, _), value in zip(ProberPing.PERCENTILES, percentiles):
+                m = {
+                    "name": "rtt_" + name,
+                    "series": False,
+                    "type": "float",
+                    "unit": self._rtt_units,
+                    "value": value,
+                }
+                metrics.append(m)
+
+            m = {
+                "name": "rtt",
+                "series": True,
+                "type": "float",
+                "unit": self._rtt_units,
+                "value": self.sampled(),
+            }
+            metrics.append(m)
+        return metrics
 
     def options(self, opts):
         options = self.serialize(opts)
@@ -36,6 +121,8 @@ class ProberPing(Prober):
         for k, v in options.items():
             if k == 'target':
                 continue
+            elif k == 'series_max':
+                self._series_max = int(v)
             else:
                 opts.extend([k, v])
         if 'target' in options:
@@ -105,6 +192,7 @@ class ProberPing(Prober):
                 }
 
                 _eval = [m1, m2, m3, m4, m5]
+                _eval.extend(self.series())
 
         return _eval
 
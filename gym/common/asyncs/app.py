@@ -12,9 +12,28 @@ from urllib.parse import urlparse
 
 from gym.common.messages import Message, rpc_map
 from gym.common.events import EventMsg
+from gym.common import wire
+
+
+# receivers do not deduplicate messages, so only posts that never reached a peer are retried
+RETRY_ERRORS = (aiohttp.ClientConnectorError,)
+if hasattr(aiohttp, 'ConnectionTimeoutError'):
+    RETRY_ERRORS += (aiohttp.ConnectionTimeoutError,)
 
 
 class App():
+    CONNECTIONS = 100
+    CONNECTIONS_HOST = 8
+    CONCURRENCY = 32
+    RETRIES = 2
+    BACKOFF = 0.2
+    TIMEOUT = 30
+    CONNECT_TIMEOUT = 10
+    # bodies are read and sent in chunks, compressed above COMPRESS bytes when enabled
+    CHUNK = 64 * 1024
+    COMPRESS = 256 * 1024
+    MAX_SIZE = 1024 ** 3
+
     def __init__(self):
         self.handler = None
         self.routes = []
@@ -23,6 +42,12 @@ class App():
         self.app = web.Application(loop=self.loop)
         self.in_queue = asyncio.Queue()
         self.out_queue = asyncio.Queue()
+        self._session = None
+        self._semaphore = None
+        self.binary = False
+        self._binary_peers = set()
+        self.compress = False
+        self._encodings = {}
 
     def _register_event_callers(self, cls):
         for _k, m in inspect.getmembers(cls, inspect.ismethod):
@@ -36,7 +61,11 @@ class App():
 
     async def cleanup_background_tasks(self, app):
         app['dispatch'].cancel()
-        await app['dispatch']
+        try:
+            await app['dispatch']
+        except asyncio.CancelledError:
+            pass
+        await self.close()
 
     def config_app(self):
         (inits, closes) = self.handler.get_jobs()
@@ -64,7 +93,14 @@ class App():
     def set_routes(self):
         raise Exception("Routes not set for App")
 
-    def main(self, url):
+    def main(self, url, info=None):
+        if info and info.get("binary"):
+            if wire.available():
+                self.binary = True
+            else:
+                logger.info("msgpack not available - binary wire format disabled")
+        if info and info.get("compress"):
+            self.compress = True
         self.config_app()
         self.set_routes()
         self.config_routes(self.routes)
@@ -73,18 +109,65 @@ class App():
         host, port = url_parsed.hostname, url_parsed.port
         web.run_app(self.app, host=host, port=port)
         
-    def validate_payload(self, raw_data):
-        payload = raw_data.decode(encoding='UTF-8')
+    def validate_payload(self, raw_data, content_type=wire.JSON):
+        if content_type == wire.MSGPACK:
+            if not wire.available():
+                logger.error('Message payload is msgpack but msgpack is not available')
+                return None
+            try:
+                msg_parsed = Message.parse_dict(wire.unpack(raw_data), rpc_map)
+            except (ValueError, TypeError) as e:
+                logger.error('Message payload is not msgpack serialisable: %s', e)
+                msg_parsed = None
+            return msg_parsed
+
         try:
-            msg_parsed = Message.parse(payload, rpc_map)
+            msg_parsed = Message.parse(raw_data, rpc_map)
         except ValueError:
             logger.error('Message payload is not json serialisable')
             msg_parsed = None
         return msg_parsed
 
+    async def read_payload(self, request):
+        # the body arrives already decompressed chunk by chunk,
+        # msgpack is parsed as it comes and json is kept in one buffer
+        unpacker = None
+        if request.content_type == wire.MSGPACK and wire.available():
+            unpacker = wire.unpacker(App.MAX_SIZE)
+        raw_data, parsed, size = bytearray(), None, 0
+        async for chunk in request.content.iter_chunked(App.CHUNK):
+            size += len(chunk)
+            if size > App.MAX_SIZE:
+                raise web.HTTPRequestEntityTooLarge(App.MAX_SIZE, size)
+            if unpacker:
+                if parsed is not None:
+                    raise ValueError('extra data after msgpack message')
+                parsed = wire.feed(unpacker, chunk)
+            else:
+                raw_data.extend(chunk)
+
+        if not unpacker:
+            return self.validate_payload(raw_data, request.content_type)
+        if parsed is None:
+            logger.error('Message payload is not complete msgpack')
+            return None
+        try:
+            msg_parsed = Message.parse_dict(parsed, rpc_map)
+        except (ValueError, TypeError) as e:
+            logger.error('Message payload is not msgpack serialisable: %s', e)
+            msg_parsed = None
+        return msg_parsed
+
     async def handle(self, request):
-        raw_data = await request.read()        
-        msg = self.validate_payload(raw_data)
+        # acks advertise the accepted body encodings, and msgpack only from binary peers
+        headers = {'Accept-Encoding': ", ".join(wire.decodings())}
+        if self.binary:
+            headers['Accept'] = wire.MSGPACK
+        try:
+            msg = await self.read_payload(request)
+        except ValueError as e:
+            logger.error('Message payload could not be read: %s', e)
+            msg = None
         if msg:            
             logger.debug("Handle msg from %s prefix/identifier %s",
                         request.remote, request.match_info['identifier'])
@@ -92,40 +175,92 @@ class App():
             msg.sender(request.remote, request.match_info['identifier'])
             ev_msg = EventMsg(msg)
             self.in_queue.put_nowait(ev_msg)
-            return web.HTTPOk(text="Ack")
+            return web.HTTPOk(text="Ack", headers=headers)
         else:
-            return web.HTTPError(text="Bad Payload")
+            return web.HTTPError(text="Bad Payload", headers=headers)
 
-    async def send(self, url, data):
-        async def post(session, url, data):
-            try:
-                async with session.post(url, data=data) as response:
-                    resp_text = await response.text()
-                    logger.info("Http post sent to %s: status %s - response %s", url, response.status, resp_text)
-                    return resp_text
-            except OSError as err:
-                logger.info("Could not establish connection with %s", url)
-                logger.debug("Error message: %s", err)
-
-        async with aiohttp.ClientSession() as session:
-            html = await post(session, url, data)
-            return html
+    def session(self):
+        # one keep-alive session per app, shared by all outputs
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=App.CONNECTIONS, limit_per_host=App.CONNECTIONS_HOST)
+            timeout = aiohttp.ClientTimeout(total=App.TIMEOUT, connect=App.CONNECT_TIMEOUT)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+            self._semaphore = asyncio.Semaphore(App.CONCURRENCY)
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _peer(self, url):
+        url_parsed = urlparse(url)
+        return url_parsed.netloc
+
+    def _encode(self, output, url):
+        if self.binary and self._peer(url) in self._binary_peers:
+            return wire.pack(output), wire.MSGPACK
+        return output.to_json(), wire.JSON
+
+    def _body(self, url, data):
+        # large bodies go out chunked, compressed if enabled, so no full compressed copy is built
+        if len(data) < App.CHUNK:
+            return data, None
+        encoding = None
+        if self.compress and len(data) >= App.COMPRESS:
+            encoding = wire.encoding(self._encodings.get(self._peer(url), ''))
+        return wire.stream(data, App.CHUNK, encoding), encoding
+
+    async def send(self, url, data, content_type=wire.JSON):
+        session = self.session()
+        async with self._semaphore:
+            for attempt in range(App.RETRIES + 1):
+                # a stream is consumed by each attempt, so the body is set up for every one
+                body, encoding = self._body(url, data)
+                headers = {'Content-Type': content_type}
+                options = {}
+                if encoding:
+                    headers['Content-Encoding'] = encoding
+                if body is not data:
+                    # slow links may take longer than TIMEOUT for the whole body, only stalls are timed out
+                    options['timeout'] = aiohttp.ClientTimeout(connect=App.CONNECT_TIMEOUT, sock_read=App.TIMEOUT)
+                try:
+                    async with session.post(url, data=body, headers=headers, **options) as response:
+                        if self.binary and wire.MSGPACK in response.headers.get('Accept', ''):
+                            self._binary_peers.add(self._peer(url))
+                        if 'Accept-Encoding' in response.headers:
+                            self._encodings[self._peer(url)] = response.headers['Accept-Encoding']
+                        resp_text = await response.text()
+                        logger.info("Http post sent to %s: status %s - response %s", url, response.status, resp_text)
+                        return resp_text
+                except RETRY_ERRORS as err:
+                    logger.debug("Error message: %s", err)
+                    if attempt < App.RETRIES:
+                        await asyncio.sleep(App.BACKOFF * 2 ** attempt)
+                except (OSError, aiohttp.ClientError, asyncio.TimeoutError) as err:
+                    # the message may have been delivered already
+                    logger.info("Http post to %s failed after connecting: %s", url, err)
+                    return None
+            logger.info("Could not establish connection with %s", url)
+            return None
+
+    async def dispatch(self, outputs):
+        sends = []
+        for output in outputs:
+            url = output.get_to()
+            if url:
+                data, content_type = self._encode(output, url)
+                sends.append(self.send(url, data, content_type))
+            else:
+                logger.debug("No url provided for %s", output)
+        if sends:
+            await asyncio.gather(*sends)
 
     async def _output_loop(self):
         logger.debug("Output Loop Started")
         while True:
-            try:
-                outputs = self.out_queue.get_nowait()
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.5)
-                # continue
+            outputs = await self.out_queue.get()
+            if outputs:
+                await self.dispatch(outputs)
             else:
-                if outputs:
-                    for output in outputs:
-                        url, data = output.get_to(), output.to_json()
-                        if url:
-                            await self.send(url, data)
-                        else:
-                            logger.debug("No url provided for %s", output)
-                else:
-                    logger.debug("Nothing to output")
+                logger.debug("Nothing to output")
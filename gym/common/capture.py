@@ -0,0 +1,83 @@
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class Ring:
+    def __init__(self, size=None):
+        self._size = size
+        self._chunks = deque()
+        self._length = 0
+        self._dropped = 0
+
+    def write(self, chunk):
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+        if self._size:
+            while self._length > self._size:
+                excess = self._length - self._size
+                head = self._chunks[0]
+                if len(head) <= excess:
+                    self._chunks.popleft()
+                    self._length -= len(head)
+                    self._dropped += len(head)
+                else:
+                    self._chunks[0] = head[excess:]
+                    self._length -= excess
+                    self._dropped += excess
+
+    def dropped(self):
+        return self._dropped
+
+    def getvalue(self):
+        return b''.join(self._chunks)
+
+
+class Capture:
+    CHUNK = 65536
+
+    def __init__(self, consumer=None, size=None):
+        self._consumer = consumer
+        self._threads = []
+        self.out = Ring(size)
+        self.err = Ring(size)
+
+    def _feed(self, lines):
+        for line in lines:
+            try:
+                self._consumer(line.decode('utf-8', 'replace'))
+            except Exception as e:
+                logger.debug("Capture consumer exception %s", e)
+
+    def _pump(self, stream, ring, consumer):
+        pending = b''
+        while True:
+            chunk = stream.read1(Capture.CHUNK)
+            if not chunk:
+                break
+            ring.write(chunk)
+            if consumer:
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                self._feed(lines)
+        if consumer and pending:
+            self._feed([pending])
+        stream.close()
+
+    def start(self, process):
+        self._threads = [
+            threading.Thread(target=self._pump, args=(process.stdout, self.out, self._consumer)),
+            threading.Thread(target=self._pump, args=(process.stderr, self.err, None)),
+        ]
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        if self.out.dropped():
+            logger.debug("Capture ring dropped %s bytes of output", self.out.dropped())
+        return self.out.getvalue(), self.err.getvalue()
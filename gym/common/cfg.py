@@ -40,6 +40,14 @@ class Config:
                             action='store_true',
                             help='Define the app logging mode (default: False)')
 
+        parser.add_argument('--binary',
+                            action='store_true',
+                            help='Define the app to use msgpack with peers that accept it (default: False)')
+
+        parser.add_argument('--compress',
+                            action='store_true',
+                            help='Define the app to compress large messages it sends (default: False)')
+
         parser.add_argument('--cfg',
                             type=str,
                             help='Define the cfg (id + url) (default: None)')
@@ -58,9 +66,10 @@ class Config:
             
     def check_config(self):
         _contacts = None
+        cfg_data = {}
 
         if self.cfg.cfg:
-            cfg_data = self.cfg_args()
+            cfg_data = self.cfg_args() or {}
             _id = cfg_data.get('id', None)
             _url = cfg_data.get('url', None)
             _contacts = cfg_data.get('contacts', None)
@@ -70,12 +79,16 @@ class Config:
 
         if _id and _url:
             logger.info("Init cfg: id %s - url %s", _id, _url)
-            info = {
+            # other cfg file settings (e.g., storage, binary) are kept as provided
+            info = dict(cfg_data)
+            info.update({
                 "id": _id,
                 "url": _url,
                 "contacts": _contacts,
-                "debug": self.cfg.debug
-            }
+                "debug": self.cfg.debug or cfg_data.get("debug", False),
+                "binary": self.cfg.binary or cfg_data.get("binary", False),
+                "compress": self.cfg.compress or cfg_data.get("compress", False),
+            })
             print("provided info", info)
             return info
         else:
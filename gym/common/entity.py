@@ -111,6 +111,10 @@ class Messenger():
                 logger.debug("ack_all %s", ack_all)
                 return ack_all
 
+    def get_waits(self, input_id):
+        waits = self._in_mapping_out[input_id]['wait']
+        return waits
+
     def get_acks(self, input_id):
         acks = self._in_mapping_out[input_id]['ack'].values()
         return acks
@@ -155,35 +159,30 @@ class Messenger():
     async def _event_loop(self):
         logger.debug("Event Loop Started")
         while True:
-            try:
-                ev = self.in_q.get_nowait()
-            except asyncio.QueueEmpty:
-                await asyncio.sleep(0.5)
-                # continue
+            ev = await self.in_q.get()
+            logger.debug("event_loop got ev %s", ev)
+            handlers = self.get_handlers(ev)
+            if handlers:
+                for handler in handlers:
+                    try:
+                        logger.debug("event_loop handler %s", handler)
+                        handler(ev)
+                    except Exception as e:
+                        logger.debug("Excenption on event_loop handler: %s", e)
+                        logger.exception(e)
+                        # Normal exit.
+                        # Propagate upwards, so we leave the event loop.
+                        raise
+                    except:
+                        logger.debug("event loop handler raised an exception")
             else:
-                logger.debug("event_loop got ev %s", ev)
-                handlers = self.get_handlers(ev)
-                if handlers:
-                    for handler in handlers:
-                        try:
-                            logger.debug("event_loop handler %s", handler)
-                            handler(ev)
-                        except Exception as e:
-                            logger.debug("Excenption on event_loop handler: %s", e)
-                            logger.exception(e)
-                            # Normal exit.
-                            # Propagate upwards, so we leave the event loop.
-                            raise
-                        except:
-                            logger.debug("event loop handler raised an exception")
-                else:
-                    scheduled_events = self.check_agenda(ev)
-                    if scheduled_events:
-                        logger.info("Scheduled triggers for event %s", ev.__name__)
-                        for event in scheduled_events:
-                            event_call = event.get("event")
-                            logger.info("calling event %s", event_call.name)
-                            self.send_event(event_call)
+                scheduled_events = self.check_agenda(ev)
+                if scheduled_events:
+                    logger.info("Scheduled triggers for event %s", ev.__name__)
+                    for event in scheduled_events:
+                        event_call = event.get("event")
+                        logger.info("calling event %s", event_call.name)
+                        self.send_event(event_call)
 
 
 class Component(Messenger):
@@ -193,7 +192,20 @@ class Component(Messenger):
         self.profiler = Profiler()
         self.identity = Identity(url=info.get("url"), uuid=info.get("id"), role=role)
         self.contacts = info.get("contacts", [])
+        self._tasks = set()
         
+    def spawn(self, coro):
+        # the loop only keeps weak references to tasks, so running ones are kept here
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._spawned)
+        return task
+
+    def _spawned(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error("Task %s failed: %r", task, task.exception())
+
     def get_jobs(self):
         inits, closes = [], []
         inits.append(self.start_background_tasks)
@@ -206,7 +218,14 @@ class Component(Messenger):
 
     async def cleanup_background_tasks(self, app):
         app['event_loop'].cancel()
-        await app['event_loop']
+        try:
+            await app['event_loop']
+        except asyncio.CancelledError:
+            pass
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
 
     def stamp_output(self, input, output):
         input_prefix = input.get_prefix()
@@ -340,9 +359,9 @@ class Component(Messenger):
             self.ack_info(msg)
         
     def ack_info(self, msg):
-        ack = self.peers.info(msg)
-        if ack:
-            self.update_info()
+        peer = self.peers.info(msg)
+        if peer:
+            self.update_info(peer)
 
-    def update_info(self):
+    def update_info(self, peer=None):
         pass
\ No newline at end of file
@@ -0,0 +1,125 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+import json
+import asyncio
+import aiohttp
+
+
+class Bulk:
+    RETRY_STATUS = [429, 502, 503, 504]
+
+    def __init__(self, url='http://172.17.0.1:9200', index='gym-evaluations',
+                 batch=500, retries=3, backoff=0.5, timeout=30, connections=4):
+        self.url = url.rstrip('/') if '://' in url else 'http://' + url.rstrip('/')
+        self.index = index
+        self.batch = batch
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.connections = connections
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.connections)
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def documents(self, vnfbr):
+        # one document per evaluation, carrying its report/snapshot context
+        vnfbr_id = vnfbr.get("id")
+        vnfpp = vnfbr.get("vnfpp") or {}
+        for report in vnfpp.get("reports") or []:
+            for snap in report.get("snapshots") or []:
+                origin = snap.get("origin") or {}
+                for ev in snap.get("evaluations") or []:
+                    metrics, series = {}, {}
+                    for metric in ev.get("metrics") or []:
+                        if metric.get("series"):
+                            series[metric.get("name")] = metric.get("value")
+                        else:
+                            metrics[metric.get("name")] = metric.get("value")
+                    doc_id = "-".join(str(field) for field in [
+                        vnfbr_id, report.get("id"), snap.get("trial"), snap.get("id"), ev.get("id")])
+                    doc = {
+                        "vnfbr": vnfbr_id,
+                        "report": report.get("id"),
+                        "test": report.get("test"),
+                        "trial": snap.get("trial"),
+                        "snapshot": snap.get("id"),
+                        "evaluation": ev.get("id"),
+                        "role": origin.get("role"),
+                        "origin": origin.get("id"),
+                        "source": ev.get("source"),
+                        "inputs": report.get("inputs"),
+                        "timestamp": ev.get("timestamp"),
+                        "metrics": metrics,
+                        "series": series,
+                    }
+                    yield doc_id, doc
+
+    def body(self, documents):
+        lines = []
+        for doc_id, doc in documents:
+            lines.append(json.dumps({"index": {"_index": self.index, "_id": doc_id}}))
+            lines.append(json.dumps(doc, default=lambda o: o.__dict__))
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+    async def _post(self, documents):
+        session = self.session()
+        headers = {'Content-Type': 'application/x-ndjson'}
+        async with session.post(self.url + '/_bulk', data=self.body(documents), headers=headers) as response:
+            if response.status in Bulk.RETRY_STATUS:
+                return documents
+            if response.status != 200:
+                text = await response.text()
+                logger.info("bulk request failed - status %s: %s", response.status, text[:200])
+                return None
+            ack = await response.json()
+
+        # only documents rejected for load (e.g., 429) are sent again
+        failed = []
+        if ack.get("errors"):
+            for document, item in zip(documents, ack.get("items", [])):
+                status = item.get("index", {}).get("status", 200)
+                if status in Bulk.RETRY_STATUS:
+                    failed.append(document)
+                elif status >= 300:
+                    logger.info("bulk document %s not indexed: %s", document[0], item.get("index", {}).get("error"))
+        return failed
+
+    async def send(self, documents):
+        pending = documents
+        for attempt in range(self.retries + 1):
+            try:
+                pending = await self._post(pending)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug("bulk request error %s", e)
+            if pending is None:
+                return False
+            if not pending:
+                return True
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+        logger.info("bulk request gave up - %s documents not indexed", len(pending))
+        return False
+
+    async def store(self, vnfbr):
+        ack = True
+        batch = []
+        for document in self.documents(vnfbr):
+            batch.append(document)
+            if len(batch) >= self.batch:
+                ack = await self.send(batch) and ack
+                batch = []
+        if batch:
+            ack = await self.send(batch) and ack
+        return ack
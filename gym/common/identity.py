@@ -111,8 +111,8 @@ class Peers:
             self.update_peer_prefix(peer, peer_prefix)
             logger.info("Peer Info: uuid %s - role %s - prefix %s",
                         peer.get("uuid"), peer.get("role"), peer.get("prefix"))
-            return True
-        return False        
+            return peer
+        return None
 
     def add_peer(self, peer):
         self.check_peer_prefix(peer)
@@ -1,4 +1,59 @@
 import json
+import math
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _finite(o):
+    # nan and infinity are written as null, as orjson does
+    if isinstance(o, float):
+        return o if math.isfinite(o) else None
+    elif isinstance(o, dict):
+        return dict((k, _finite(v)) for k, v in o.items())
+    elif isinstance(o, (list, tuple)):
+        return [_finite(v) for v in o]
+    elif o is None or isinstance(o, (str, int)):
+        return o
+    return _finite(encode(o))
+
+
+def _constant(name):
+    return None
+
+
+def dumps(data):
+    # compact, single pass: nested contents are handed to the encoder as dicts
+    if orjson:
+        return orjson.dumps(data, default=encode, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    try:
+        return json.dumps(data, default=encode, separators=(',', ':'), allow_nan=False)
+    except ValueError:
+        return json.dumps(_finite(data), separators=(',', ':'), allow_nan=False)
+
+
+def loads(data):
+    # peers without orjson may still send NaN/Infinity, read as null either way
+    if orjson:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data, parse_constant=_constant)
+
+
+def encode(o):
+    if isinstance(o, Content):
+        return o.items()
+    elif hasattr(o, 'to_json'):
+        return json.loads(o.to_json())
+    elif hasattr(o, 'items'):
+        return dict(o.items())
+    elif hasattr(o, 'tolist'):
+        return o.tolist()
+    else:
+        return o.__dict__
 
 
 class Content:
@@ -40,37 +95,38 @@ class Content:
         return _items
 
     def default(self, o):
-        if hasattr(o, 'to_json'):
-            return json.loads(o.to_json())
-        elif hasattr(o, 'items'):
-            return o.items()
-        else:
-            return o.__dict__
-
+        return encode(o)
 
     def to_json(self, _items=None, filter_keys=True):
         if _items and type(_items) == dict:
             pass
         else:
             _items = self.items()
-        return json.dumps(_items, default=self.default,
-                          sort_keys=True, indent=4)
+        return dumps(_items)
 
     def items(self, filter_keys=False):
         return self._items(dic=True, filter_keys=filter_keys)
 
     @classmethod
     def from_json(cls, msg):
+        return cls.from_dict(loads(msg))
+
+    @classmethod
+    def from_dict(cls, data):
         obj = cls()
-        json_ = json.loads(msg)
-        for (k, v) in json_.items():
-            if k in obj._items():
+        keys = obj._items()
+        for (k, v) in data.items():
+            if k in keys:
                 obj.set(k, v)
         return obj
 
     @classmethod
     def _parse(cls, msg, _map=None):
-        obj = cls.from_json(msg)
+        return cls._parse_dict(loads(msg), _map)
+
+    @classmethod
+    def _parse_dict(cls, data, _map=None):
+        obj = cls.from_dict(data)
         return obj
 
     def __iter__(self):
@@ -1,9 +1,8 @@
 import random
-import json
 import logging
 from datetime import datetime
 
-from gym.common.info import Content
+from gym.common.info import Content, loads
 from gym.common.temporal import Time
 
 logger = logging.getLogger(__name__)
@@ -64,33 +63,35 @@ class Message(Content):
     def parse(cls, msg_json, rpc_map):
         obj = None
         try:
-            json_ = json.loads(msg_json)            
+            json_ = loads(msg_json)
         except ValueError as e:
             logger.warning("Invalid json msg %s", e) # invalid json
         else:
-            if 'method' in json_.keys():
-                if json_['method'] in rpc_map:
-                    cls = rpc_map[json_['method']]
-                    obj = cls._parse(msg_json, rpc_map)
-            if 'response' in json_.keys():
-                if json_['response'] in rpc_map:
-                    cls = rpc_map[json_['response']]
-                    obj = cls._parse(msg_json, rpc_map)
-            if not obj:
-                logger.info("Message cannot be parsed with rpc_map - content: %s", json_)
+            obj = cls.parse_dict(json_, rpc_map)
         return obj
 
-    def default(self, o):
-        if hasattr(o, 'to_json'):
-            return json.loads(o.to_json())
-        elif hasattr(o, 'items'):
-            return o.items()
-        else:
-            return o.__dict__
+    @classmethod
+    def parse_dict(cls, json_, rpc_map):
+        obj = None
+        if 'method' in json_.keys():
+            if json_['method'] in rpc_map:
+                cls = rpc_map[json_['method']]
+                obj = cls._parse_dict(json_, rpc_map)
+        if 'response' in json_.keys():
+            if json_['response'] in rpc_map:
+                cls = rpc_map[json_['response']]
+                obj = cls._parse_dict(json_, rpc_map)
+        if not obj:
+            logger.info("Message cannot be parsed with rpc_map - content: %s", json_)
+        return obj
 
     @classmethod
     def _parse(cls, msg, rpc_map=None):
-        obj = cls.from_json(msg)
+        return cls._parse_dict(loads(msg), rpc_map)
+
+    @classmethod
+    def _parse_dict(cls, msg, rpc_map=None):
+        obj = cls.from_dict(msg)
         if hasattr(obj, 'result'):
             _items = obj.result.items()
         elif hasattr(obj, 'params'):
@@ -117,24 +118,24 @@ class Message(Content):
         vs = None
         sub_cls = rpc_map[k]
         if k in ['time', 'error']:
-            vs = sub_cls._parse(json.dumps(v), rpc_map)
+            vs = sub_cls._parse_dict(v, rpc_map)
         else:
             if type(v) is list:
                 vs = []
                 for item in v:
                     if type(item) is dict:
-                        o_act = sub_cls._parse(json.dumps(item), rpc_map)
+                        o_act = sub_cls._parse_dict(item, rpc_map)
                         vs.append(o_act)
                     elif type(item) is list:
                         vss = []
                         for i in item:
-                            o_act = sub_cls._parse(json.dumps(i), rpc_map)
+                            o_act = sub_cls._parse_dict(i, rpc_map)
                             vss.append(o_act)
                         vs.append(vss)
             elif type(v) is dict:
                 vs = {}
                 for id_act, j_act in v.items():
-                    o_act = sub_cls._parse(json.dumps(j_act), rpc_map)
+                    o_act = sub_cls._parse_dict(j_act, rpc_map)
                     vs[id_act] = o_act
             else:
                 pass
@@ -191,6 +192,8 @@ class Instruction(Request):
     def __init__(self):
         Request.__init__(self, 'instruction')
         self.actions = {}
+        self.trial = 0
+        self.barrier = False
         self.time = Time()
 
     def add_action(self, action):
@@ -204,12 +207,18 @@ class Instruction(Request):
             del self.actions[_id]
 
 
+class Release(Request):
+    def __init__(self, id=None):
+        Request.__init__(self, method='release', id=id)
+
+
 class Task(Request):
     def __init__(self, id=None):
         Request.__init__(self, method='task', id=id)
         self.agents = {}
         self.monitors = {}
         self.trials = 0
+        self.parallel = 1
         self.test = 0
         self.time = Time()
 
@@ -225,6 +234,7 @@ class Layout(Request):
         Request.__init__(self, method='layout')
         self._ids = 0
         self.vnf_bd = {}
+        self.priority = 0
         self.callback = None
         self.time = Time()
 
@@ -298,6 +308,12 @@ class Snapshot(Response):
         self.evaluations = {}
 
 
+class Ready(Response):
+    def __init__(self, id=0):
+        Response.__init__(self, id, response='ready')
+        self.ports = []
+
+
 class Report(Response):
     def __init__(self, id=0):
         Response.__init__(self, id, response='report')
@@ -331,11 +347,13 @@ rpc_map = {
     'hello':Hello,
     'action':Action,
     'instruction':Instruction,
+    'release':Release,
     'task':Task,
     'layout': Layout,
     'info':Info,
     'evaluation':Evaluation,
     'snapshot': Snapshot,
+    'ready': Ready,
     'report': Report,
     'deploy': Deploy,
     'built': Built,
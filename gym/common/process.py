@@ -1,9 +1,17 @@
 import os
 import json
+import signal
 import logging
+import asyncio
+import hashlib
+import importlib.util
 import subprocess
 import time
-from multiprocessing import Process, Queue
+from multiprocessing import Process, Pipe
+from multiprocessing.connection import wait
+from concurrent.futures import ThreadPoolExecutor
+
+from gym.common.capture import Capture, Ring
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +51,22 @@ class Loader:
             break
         return self._files
 
+    def load_module(self, file_path):
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        spec = importlib.util.spec_from_file_location(name, file_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    def load_file_classes(self, file_path, class_begin_with):
+        classes = {}
+        module = self.load_module(file_path)
+        for c in dir(module):
+            cls = getattr(module, c)
+            if c.startswith(class_begin_with) and getattr(cls, '__module__', None) == module.__name__:
+                classes[c] = cls
+        return classes
+
     def load_classes(self, folder, file_begin_with, class_begin_with):
         files = self.load_files(folder, file_begin_with)
         files = [f.split('.')[0] for f in files if f.endswith('.py')]
@@ -55,13 +79,71 @@ class Loader:
         return self._classes
 
 
+class Manifest:
+    def __init__(self, filepath=None):
+        self._filepath = filepath
+        self._entries = {}
+        self._changed = False
+        self.load()
+
+    def load(self):
+        if self._filepath and os.path.isfile(self._filepath):
+            try:
+                with open(self._filepath, 'r') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.debug("Could not load manifest cache %s: %s", self._filepath, e)
+                self._entries = {}
+
+    def save(self):
+        if self._filepath and self._changed:
+            tmp_filepath = self._filepath + '.' + str(os.getpid())
+            try:
+                with open(tmp_filepath, 'w') as f:
+                    json.dump(self._entries, f)
+                os.replace(tmp_filepath, self._filepath)
+                self._changed = False
+                logger.debug("Manifest cache saved %s", self._filepath)
+            except OSError as e:
+                logger.debug("Could not save manifest cache %s: %s", self._filepath, e)
+
+    def key(self, file):
+        with open(file, 'rb') as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        mtime = os.stat(file).st_mtime
+        return mtime, digest
+
+    def get(self, file):
+        entry = self._entries.get(file, None)
+        if entry:
+            mtime, digest = self.key(file)
+            if entry.get('mtime') == mtime and entry.get('hash') == digest:
+                return entry.get('info')
+        return None
+
+    def set(self, file, info):
+        mtime, digest = self.key(file)
+        self._entries[file] = {
+            'mtime': mtime,
+            'hash': digest,
+            'info': info,
+        }
+        self._changed = True
+
+
 class Processor:
     def __init__(self):
         self.process = None
 
-    def start_process(self, args, queue, stop=False, timeout=60):
+    def start_process(self, args, conn, stop=False, timeout=60):
         return_code = 0
         out, err = '', None
+        p = None
+        try:
+            # leads its own process group, so an expired run takes its tool down with it
+            os.setsid()
+        except OSError:
+            pass
         try:
             p = subprocess.Popen(args,
                 stdin = subprocess.PIPE,
@@ -70,32 +152,34 @@ class Processor:
                 )
             self.process = p
             logger.debug('process started %s', p.pid)
+            capture = Capture()
+            capture.start(p)
             if stop:
                 if self.stop_process(timeout):
-                    out, err = p.communicate()
+                    p.wait()
+                    out, err = capture.join()
                     return_code = p.returncode
                 else:
                     return_code = -1
                     err = 'ERROR: Process not defined'
             else:
                 logger.debug('process communicate %s', p.pid)
-                out, err = p.communicate()
+                p.wait()
+                out, err = capture.join()
                 return_code = p.returncode
         except OSError:
             return_code = -1
             err = 'ERROR: exception OSError'
         finally:
-            logger.debug('process finished %s', p.pid)
+            logger.debug('process finished %s', p.pid if p else None)
             if return_code != 0:
-                queue_answer = err
+                answer = err
                 logger.error(err)
             else:
-                queue_answer = out
+                answer = out
             self.process = None
-            queue.put(return_code)
-            queue.put(queue_answer)
-            queue.put('STOP')
-            queue.close()
+            conn.send((return_code, answer))
+            conn.close()
             return return_code
 
     def stop_process(self, timeout):
@@ -115,57 +199,92 @@ class Multiprocessor:
         self.processor = Processor()
 
     def make_process(self,  cmd, stop, timeout):
-        q = Queue()
-        p = Process(target=self.processor.start_process, args=(cmd, q, stop, timeout))
-        return (p,q)
+        reader, writer = Pipe(duplex=False)
+        p = Process(target=self.processor.start_process, args=(cmd, writer, stop, timeout))
+        return (p, reader, writer)
 
     def start_processes(self, cmds, stop, timeout):
         self.processes = {}
         for _id,cmd in cmds.items():
             self.processes[_id] = self.make_process(cmd, stop, timeout)
         logger.debug('Starting processes %s', self.processes)
-        for (p,q) in self.processes.values():
+        for (p, reader, writer) in self.processes.values():
             p.start()
-
-    def check_processes(self):
-        logger.debug("checking processes")
-        any_alive = True
-        while any_alive:
-            any_alive = any([p.is_alive() for (p,q) in self.processes.values()])
-            all_queued = all([not q.empty() for (p, q) in self.processes.values()])
-            time.sleep(0.05)
-            if all_queued and any_alive:
-                break
-        return True
-
-    def dump_queues(self, queue):
-        return_code = queue.get_nowait()
-        result = ""
-        for i in iter(queue.get_nowait, 'STOP'):
-            if type(i) is bytes:
-                i_dec = i.decode("utf-8") 
-            else:
-                i_dec = i
-            result += i_dec
-        return return_code,result
-
-    def get_processes_queue(self):
-        outs = {}
-        for _id, (p, q) in self.processes.items():
-            try:
-                exitcode, _res = self.dump_queues(q)
-            except Exception as e:
-                logger.debug("Process id %s dump queue exception %s", _id, e)
-            else:
+            # Only the child keeps the writer end, so the reader gets EOF if it dies
+            writer.close()
+
+    def _deadlines(self, deadline):
+        deadlines = {}
+        now = time.monotonic()
+        for _id in self.processes:
+            _deadline = deadline.get(_id) if type(deadline) is dict else deadline
+            deadlines[_id] = now + float(_deadline) if _deadline else None
+        return deadlines
+
+    def _decode(self, answer):
+        if type(answer) is bytes:
+            answer = answer.decode("utf-8")
+        elif answer is None:
+            answer = ""
+        return answer
+
+    def _finish(self, _id):
+        p, reader, _ = self.processes[_id]
+        reader.close()
+        p.join(timeout=1)
+        if p.is_alive():
+            p.terminate()
+
+    def _killpg(self, p, sig):
+        try:
+            os.killpg(p.pid, sig)
+        except OSError:
+            # no group (yet), so no tool was started or it is already gone
+            if p.is_alive() and sig == signal.SIGKILL:
+                p.kill()
+            elif p.is_alive():
                 p.terminate()
-                outs[_id] = (exitcode, _res)
-        return outs
 
-    def run(self, cmds, stop=False, timeout=60):
+    def _expire(self, _id):
+        p, reader, _ = self.processes[_id]
+        self._killpg(p, signal.SIGTERM)
+        reader.close()
+        p.join(timeout=1)
+        # the tool may outlive its parent if it ignores SIGTERM
+        self._killpg(p, signal.SIGKILL)
+        p.join()
+        logger.debug("Process id %s expired", _id)
+
+    def stream(self, cmds, stop=False, timeout=60, deadline=None):
         self.start_processes(cmds, stop, timeout)
+        deadlines = self._deadlines(deadline)
+        waiting = {reader: _id for _id, (p, reader, _) in self.processes.items()}
+
+        while waiting:
+            expires = [deadlines[_id] for _id in waiting.values() if deadlines[_id]]
+            wait_timeout = max(min(expires) - time.monotonic(), 0) if expires else None
+            ready = wait(list(waiting.keys()), timeout=wait_timeout)
+
+            for reader in ready:
+                _id = waiting.pop(reader)
+                try:
+                    exitcode, answer = reader.recv()
+                except EOFError:
+                    exitcode, answer = -1, 'ERROR: process exited without output'
+                self._finish(_id)
+                yield (_id, exitcode, self._decode(answer))
+
+            now = time.monotonic()
+            for reader, _id in list(waiting.items()):
+                if deadlines[_id] and deadlines[_id] <= now:
+                    del waiting[reader]
+                    self._expire(_id)
+                    yield (_id, -1, 'ERROR: process deadline expired')
+
+    def run(self, cmds, stop=False, timeout=60, deadline=None):
         _outputs = {}
-        if self.check_processes():
-            _outputs = self.get_processes_queue()
+        for _id, exitcode, output in self.stream(cmds, stop, timeout, deadline):
+            _outputs[_id] = (exitcode, output)
         return _outputs
 
 
@@ -248,9 +367,10 @@ class Executor:
             parsed_outs[_id] = self._output(ret, out)
         return parsed_outs
 
-    def run(self, cmds, **kwargs):
+    def stream(self, cmds, **kwargs):
         stop = False
         timeout = 0
+        deadline = None
         remote = False
         host = None
         user = None
@@ -258,6 +378,8 @@ class Executor:
             stop = kwargs['stop']
         if 'timeout' in kwargs:
             timeout = kwargs['timeout']
+        if 'deadline' in kwargs:
+            deadline = kwargs['deadline']
         if 'remote' in kwargs:
             remote = kwargs['remote']
             if 'host' in kwargs and 'user' in kwargs:
@@ -268,12 +390,21 @@ class Executor:
                 raise Exception
 
         _built_cmds = self._build_cmd(cmds, remote=remote, host=host, user=user)
-        _outputs = self._multi_processor.run(_built_cmds, stop, timeout)
+        for _id, exitcode, output in self._multi_processor.stream(_built_cmds, stop, timeout, deadline):
+            yield (_id, exitcode, output)
+
+    def run(self, cmds, **kwargs):
+        _outputs = {}
+        for _id, exitcode, output in self.stream(cmds, **kwargs):
+            _outputs[_id] = (exitcode, output)
         _outs = self._parse_outputs(_outputs)
         return _outs
 
 
 class Actuator(Executor):
+    # seconds a script has to answer --info before it is killed
+    INFO_DEADLINE = 30
+
     def __init__(self):
         Executor.__init__(self)
         self.stimulus = {}
@@ -281,6 +412,8 @@ class Actuator(Executor):
         self.acts = {}
         self._cfg = None
         self._loader = Loader()
+        self._classes = {}
+        self._pool = None
         
     def get_acts(self):
         return self.acts
@@ -289,6 +422,40 @@ class Actuator(Executor):
         self._cfg = cfg
         self._load_acts()
 
+    def _load_act_class(self, file):
+        class_prefix = self._cfg.get("class_prefix")
+        if not class_prefix:
+            return None
+        try:
+            classes = self._loader.load_file_classes(file, class_prefix)
+        except Exception as e:
+            logger.debug("Could not load act class %s: %s", file, e)
+        else:
+            act_classes = [cls for cls in classes.values()
+                           if hasattr(cls, 'PARAMETERS') and hasattr(cls, 'METRICS')]
+            if act_classes:
+                return act_classes.pop()
+        return None
+
+    def _import_act(self, file):
+        cls = self._load_act_class(file)
+        if cls:
+            try:
+                act = cls()
+                act_info = json.loads(act.main(['--info']))
+            except (Exception, SystemExit) as e:
+                logger.debug("Could not import act %s: %s", file, e)
+            else:
+                if act_info.get('id', None):
+                    self._classes[act_info['id']] = cls
+                return act_info
+        return None
+
+    def _add_act(self, file, act_info):
+        if act_info.get('id', None):
+            act_info['file'] = file
+            self.acts[act_info['id']] = act_info
+
     def _load_acts(self):
         files = self._loader.load_files(
             self._cfg.get("folder"),
@@ -296,18 +463,31 @@ class Actuator(Executor):
             self._cfg.get("suffix"),
             self._cfg.get("full_path")
         )
-        
+        manifest = Manifest(self._cfg.get("cache"))
+
+        cmds = {}
         for file in files:
-            cmd = {1:[file, '--info']}
-            output = self.run(cmd)
-            for _, (ack, out) in output.items():
+            act_info = manifest.get(file)
+            if not act_info:
+                act_info = self._import_act(file)
+                if act_info:
+                    manifest.set(file, act_info)
+            if act_info:
+                self._add_act(file, act_info)
+            else:
+                cmds[file] = [file, '--info']
+
+        if cmds:
+            outputs = self.run(cmds, deadline=Actuator.INFO_DEADLINE)
+            for file, (ack, out) in outputs.items():
                 if ack:
                     act_info = json.loads(out)
-                    if act_info.get('id', None):
-                        act_info['file'] = file
-                        self.acts[act_info['id']] = act_info
+                    manifest.set(file, act_info)
+                    self._add_act(file, act_info)
                 else:
-                    logger.debug("Could not load act %s", cmd)
+                    logger.debug("Could not load act %s", cmds[file])
+
+        manifest.save()
 
     def _parse_act_args(self, stimulus, act):
         stimulus_args = stimulus.get('parameters')
@@ -328,6 +508,49 @@ class Actuator(Executor):
             act_cmd.extend(args)
         return act_cmd
 
+    def _pooled(self):
+        execution = self._cfg.get("execution", "pool") if self._cfg else "process"
+        return execution == "pool"
+
+    def _act_class(self, act):
+        act_id = act.get('id')
+        if act_id not in self._classes:
+            self._classes[act_id] = self._load_act_class(act.get('file'))
+        return self._classes[act_id]
+
+    def _parse_act_call(self, stimulus):
+        act_call = None
+        if stimulus['id'] in self.acts:
+            act = self.acts[stimulus['id']]
+            cls = self._act_class(act)
+            if cls:
+                args = self._parse_act_args(stimulus, act)
+                act_call = (cls, [str(arg) for arg in args])
+        return act_call
+
+    def _call_act(self, cls, args, act=None):
+        try:
+            act = act if act else cls()
+            out = act.main(args)
+        except (Exception, SystemExit) as e:
+            logger.debug("Act %s call exception %s", cls.__name__, e)
+            return None, str(e)
+        else:
+            return 'ok', out
+
+    def _executor(self):
+        if not self._pool:
+            workers = self._cfg.get("workers", 16)
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+        return self._pool
+
+    def submit(self, calls):
+        pool = self._executor()
+        futures = {}
+        for _id, (cls, args) in calls.items():
+            futures[_id] = pool.submit(self._call_act, cls, args)
+        return futures
+
     def _load_instruction(self, inst):
         actions = inst.get('actions')
         for _,action in actions.items():
@@ -336,24 +559,201 @@ class Actuator(Executor):
     def _exec_stimulus(self):
         self.evals = {}
         act_cmds = {}
+        act_calls = {}
         for _id,stimulus in self.stimulus.items():
-            act_cmds[_id] = self._parse_act_cmd(stimulus)
+            act_call = self._parse_act_call(stimulus) if self._pooled() else None
+            if act_call:
+                act_calls[_id] = act_call
+            else:
+                act_cmds[_id] = self._parse_act_cmd(stimulus)
+
+        outputs = {}
+        futures = self.submit(act_calls) if act_calls else {}
         if act_cmds:
-            outputs = self.run(act_cmds)
-            self._check_outputs(outputs)
+            # acts may be given an upper bound on their run time, e.g. {"deadline": 600}
+            outputs.update(self.run(act_cmds, deadline=self._cfg.get("deadline") if self._cfg else None))
+        for _id, future in futures.items():
+            outputs[_id] = future.result()
+        self._check_outputs(outputs)
+
+    def _evaluate(self, runner_id, ack, out):
+        if ack:
+            return (True, runner_id, json.loads(out))
+        else:
+            return (False, runner_id, out)
 
     def _check_outputs(self, outputs):
         for _id, output in outputs.items():
             ack, out = output
             stm = self.stimulus[_id]
             runner_id = stm.get('id')
-            if ack:
-                self.evals[_id] = (True, runner_id, json.loads(out))
-            else:
-                self.evals[_id] = (False, runner_id, out)
+            self.evals[_id] = self._evaluate(runner_id, ack, out)
 
     def act(self, instruction):
         self.stimulus = {}
         self._load_instruction(instruction)
         self._exec_stimulus()
         return self.evals
+
+
+class AsyncActuator(Actuator):
+    # stdout/stderr kept per act run, the tail is kept if a tool writes more
+    OUTPUT_SIZE = 16 * 1024 * 1024
+
+    def __init__(self):
+        Actuator.__init__(self)
+        self._chunk_size = 65536
+
+    def _deadline(self):
+        return self._cfg.get("deadline") if self._cfg else None
+
+    def _output_size(self):
+        return self._cfg.get("output_size", AsyncActuator.OUTPUT_SIZE) if self._cfg else AsyncActuator.OUTPUT_SIZE
+
+    async def _read(self, stream, ring):
+        while True:
+            chunk = await stream.read(self._chunk_size)
+            if not chunk:
+                break
+            ring.write(chunk)
+
+    async def _communicate(self, p, out, err):
+        await asyncio.gather(self._read(p.stdout, out), self._read(p.stderr, err))
+        return await p.wait()
+
+    def _killpg(self, p, sig):
+        try:
+            os.killpg(p.pid, sig)
+        except OSError:
+            try:
+                p.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+    async def _expire(self, p):
+        self._killpg(p, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(p.wait(), 1)
+        except asyncio.TimeoutError:
+            self._killpg(p, signal.SIGKILL)
+            await p.wait()
+        logger.debug('process expired %s', p.pid)
+
+    async def _spawn(self, cmd, deadline=None):
+        built_cmd = self._cmd_exec_local(cmd)
+        try:
+            # in its own process group, so an expired run takes its tool down with it
+            p = await asyncio.create_subprocess_exec(*built_cmd,
+                stdin = asyncio.subprocess.DEVNULL,
+                stdout = asyncio.subprocess.PIPE,
+                stderr = asyncio.subprocess.PIPE,
+                start_new_session = True,
+                )
+        except OSError:
+            return -1, 'ERROR: exception OSError'
+
+        logger.debug('process started %s', p.pid)
+        size = self._output_size()
+        out, err = Ring(size), Ring(size)
+        try:
+            return_code = await asyncio.wait_for(self._communicate(p, out, err), deadline)
+        except asyncio.TimeoutError:
+            await self._expire(p)
+            return -1, 'ERROR: process deadline expired'
+        logger.debug('process finished %s', p.pid)
+
+        if return_code != 0:
+            return return_code, err.getvalue().decode('utf-8', 'replace')
+        if out.dropped():
+            return -1, 'ERROR: process output exceeded %s bytes' % size
+        return return_code, out.getvalue().decode('utf-8')
+
+    def _stop_act(self, act):
+        # acts called in the pool run their tool through a Processor, the thread returns once it is killed
+        processor = getattr(act, '_processor', None)
+        process = getattr(processor, 'process', None)
+        if process:
+            try:
+                process.kill()
+            except OSError:
+                pass
+
+    async def _exec(self, stimulus, pool=None):
+        deadline = self._deadline()
+        act_call = self._parse_act_call(stimulus) if self._pooled() else None
+        if act_call:
+            cls, args = act_call
+            try:
+                act = cls()
+            except Exception as e:
+                logger.debug("Act %s call exception %s", cls.__name__, e)
+                return None, str(e)
+            loop = asyncio.get_event_loop()
+            future = loop.run_in_executor(pool or self._executor(), self._call_act, cls, args, act)
+            try:
+                return await asyncio.wait_for(future, deadline)
+            except asyncio.TimeoutError:
+                self._stop_act(act)
+                return None, 'ERROR: process deadline expired'
+
+        act_cmd = self._parse_act_cmd(stimulus)
+        if act_cmd:
+            ret, out = await self._spawn(act_cmd, deadline)
+            return self._output(ret, out)
+        return None, 'ERROR: act %s not available' % stimulus.get('id')
+
+    def failed(self, instruction, error):
+        # evaluations of an instruction that could not be run, so its snapshot still goes back
+        evals = {}
+        for _id, action in instruction.get('actions').items():
+            stimulus = action.get('stimulus') or {}
+            evals[_id] = (False, stimulus.get('id'), error)
+        return evals
+
+    def _listening(self, stimulus):
+        act = self.acts.get(stimulus['id'], None)
+        cls = self._act_class(act) if act else None
+        if cls:
+            try:
+                return cls().listening(stimulus.get('parameters', {}))
+            except Exception as e:
+                logger.debug("Could not check act %s listening: %s", stimulus['id'], e)
+        return None
+
+    async def act(self, instruction, barrier=None):
+        stimulus = {}
+        actions = instruction.get('actions')
+        for _,action in actions.items():
+            stimulus[action.get('id')] = action.get('stimulus')
+
+        ids = list(stimulus.keys())
+        tasks = {}
+        pools = []
+        if barrier:
+            # servers start first, everything else waits for the barrier release;
+            # a server holds its worker until its client is done, so it gets its own
+            ports = []
+            for _id in ids:
+                port = self._listening(stimulus[_id])
+                if port:
+                    ports.append(port)
+                    pool = ThreadPoolExecutor(max_workers=1) if self._pooled() else None
+                    if pool:
+                        pools.append(pool)
+                    tasks[_id] = asyncio.ensure_future(self._exec(stimulus[_id], pool))
+            await barrier(ports)
+
+        for _id in ids:
+            if _id not in tasks:
+                tasks[_id] = asyncio.ensure_future(self._exec(stimulus[_id]))
+        try:
+            outputs = await asyncio.gather(*[tasks[_id] for _id in ids])
+        finally:
+            for pool in pools:
+                pool.shutdown(wait=False)
+
+        evals = {}
+        for _id, (ack, out) in zip(ids, outputs):
+            runner_id = stimulus[_id].get('id')
+            evals[_id] = self._evaluate(runner_id, ack, out)
+        return evals
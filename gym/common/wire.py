@@ -0,0 +1,145 @@
+import sys
+import zlib
+import logging
+from array import array
+
+from gym.common.info import Content, encode
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    # request bodies are decompressed by aiohttp itself as they are read
+    from aiohttp.compression_utils import HAS_ZSTD
+except ImportError:
+    HAS_ZSTD = False
+
+logger = logging.getLogger(__name__)
+
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+# msgpack ext code of series metrics, packed as little-endian float64 arrays
+SERIES = 1
+
+
+def available():
+    return msgpack is not None
+
+
+def decodings():
+    # content encodings this process accepts in request bodies
+    if HAS_ZSTD:
+        return [ZSTD, GZIP]
+    return [GZIP]
+
+
+def encoding(accepted):
+    if zstandard is not None and ZSTD in accepted:
+        return ZSTD
+    return GZIP
+
+
+def _compressor(encoding):
+    if encoding == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compressobj()
+    # fastest level, wbits 31 writes the gzip header and trailer
+    return zlib.compressobj(1, zlib.DEFLATED, 31)
+
+
+async def stream(data, chunk, encoding=None):
+    # yields the body chunk by chunk, compressing each one as it goes
+    if isinstance(data, str):
+        data = data.encode('utf-8')
+    view = memoryview(data)
+    compressor = _compressor(encoding) if encoding else None
+    for start in range(0, len(view), chunk):
+        block = view[start:start + chunk]
+        if compressor:
+            block = compressor.compress(block)
+        if block:
+            yield block
+    if compressor:
+        yield compressor.flush()
+
+
+def _series(metrics):
+    typed = []
+    for metric in metrics:
+        if type(metric) is dict and metric.get("series") and type(metric.get("value")) is list:
+            try:
+                value = array('d', metric["value"])
+            except TypeError:
+                pass
+            else:
+                metric = dict(metric)
+                metric["value"] = value
+        typed.append(metric)
+    return typed
+
+
+def _default(o):
+    if isinstance(o, array):
+        if sys.byteorder == 'big':
+            o = array('d', o)
+            o.byteswap()
+        return msgpack.ExtType(SERIES, o.tobytes())
+    items = encode(o)
+    if isinstance(o, Content):
+        # evaluations keep their metrics in result (responses) or params (requests)
+        for key in ['result', 'params']:
+            fields = items.get(key)
+            if type(fields) is dict and type(fields.get("metrics")) is list:
+                fields = dict(fields)
+                fields["metrics"] = _series(fields["metrics"])
+                items[key] = fields
+    return items
+
+
+def _ext(code, data):
+    if code == SERIES:
+        values = array('d', data)
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tolist()
+    return msgpack.ExtType(code, data)
+
+
+def _keys(data):
+    # same map keys a json peer would see
+    if all(type(key) is str for key in data):
+        return data
+    return dict((key if type(key) is str else str(key), value) for key, value in data.items())
+
+
+def pack(content):
+    return msgpack.packb(content, default=_default, use_bin_type=True)
+
+
+def unpack(data):
+    return msgpack.unpackb(data, raw=False, ext_hook=_ext, object_hook=_keys, strict_map_key=False)
+
+
+def unpacker(max_size):
+    return msgpack.Unpacker(raw=False, ext_hook=_ext, object_hook=_keys, strict_map_key=False,
+                            max_buffer_size=max_size)
+
+
+def feed(unpacker, chunk):
+    # parses as data arrives, None until the whole message is in
+    unpacker.feed(chunk)
+    try:
+        return unpacker.unpack()
+    except msgpack.OutOfData:
+        return None
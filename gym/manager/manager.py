@@ -1,8 +1,9 @@
 import logging
 import json
+import time
 
 from gym.common.entity import Component
-from gym.common.messages import Action, Instruction, Report
+from gym.common.messages import Action, Instruction, Task, Report, Release
 
 logger = logging.getLogger(__name__)
 
@@ -17,44 +18,74 @@ class Tasks:
         if task_id not in self._tasks.keys():
             trials = task.get("trials")
             trials = int(trials) if trials else 0
+            parallel = task.get("parallel")
+            parallel = int(parallel) if parallel else 1
             task_info = {
                 "origin": task,
                 "trials": trials,
+                "parallel": max(parallel, 1),
+                "next": 0,
                 "acks": 0,
-                "pack": []
+                "pack": {}
             }
             self._tasks[task_id] = task_info
-            logger.debug("Sched task trials: %s", trials)
+            logger.debug("Sched task trials: %s - parallel %s", trials, parallel)
             return True
         return False
 
-    def ack(self, task, snaps):
-        task_id = task.get_id()
+    def _total(self, task_info):
+        # a task always runs at least one trial
+        return max(task_info["trials"], 1)
+
+    def launch(self, task_id):
+        trials = []
         task_info = self._tasks.get(task_id, None)
         if task_info:
-            task_info["acks"] += 1
-            task_info["pack"].append(snaps)
-            return True
-        return False
+            total = self._total(task_info)
+            while (task_info["next"] < total and
+                   task_info["next"] - task_info["acks"] < task_info["parallel"]):
+                trials.append(task_info["next"])
+                task_info["next"] += 1
+        return trials
 
-    def next_trial(self, task):
-        task_id = task.get_id()
+    def trial_input(self, task, trial):
+        trial_task = Task(id=":".join([str(task.get_id()), str(trial)]))
+        trial_task.set_prefix(task.get_prefix())
+        self._trials[trial_task.get_id()] = (task.get_id(), trial)
+        return trial_task
+
+    def ack(self, trial_task, snaps):
+        trial_info = self._trials.pop(trial_task.get_id(), None)
+        if trial_info:
+            task_id, trial = trial_info
+            task_info = self._tasks.get(task_id, None)
+            if task_info:
+                task_info["acks"] += 1
+                task_info["pack"][trial] = list(snaps)
+                return task_id
+        return None
+
+    def next_trial(self, task_id):
         task_info = self._tasks.get(task_id, None)
         if task_info:
-            if task_info["acks"] >= task_info["trials"]:
+            if task_info["acks"] >= self._total(task_info):
                 return False
             else:
                 return True
         return False
 
-    def info(self, task):
-        task_id = task.get_id()
+    def info(self, task_id):
         task_info = self._tasks.get(task_id, None)
         if task_info:
             return (task_info["acks"], task_info["trials"])
 
-    def checkout(self, task):
-        task_id = task.get_id()
+    def get_origin(self, task_id):
+        task_info = self._tasks.get(task_id, None)
+        if task_info:
+            return task_info.get("origin")
+        return None
+
+    def checkout(self, task_id):
         task_info = self._tasks.get(task_id, None)
         if task_info:
             pack = task_info.get("pack")
@@ -69,6 +100,7 @@ class Manager(Component):
     def __init__(self, info, in_q, out_q):
         Component.__init__(self, "manager", in_q, out_q, info)
         self.tasks = Tasks()
+        self.barriers = {}
 
     def check_ids(self, locals, requested):
         logger.debug("Verifying requested fit local components")
@@ -81,7 +113,7 @@ class Manager(Component):
         logger.debug("All Component IDs requested match locals")
         return True
 
-    def instructions(self, locals, requested, _type='agent'):
+    def instructions(self, locals, requested, _type='agent', trial_id=None):
         logger.info("Instructions")
         instructions = []
         if self.check_ids(locals, requested):
@@ -91,6 +123,9 @@ class Manager(Component):
                 runners = 'probers' if _type == 'agent' else 'listeners'
                 identity_runners = identity_features[runners]
                 inst = Instruction()
+                if trial_id:
+                    # trials run in parallel, so instruction ids are unique per trial and component
+                    inst.set_id("%s:%s" % (trial_id, req_id))
                 # logger.info("Requested stimulus %s",info['stimulus'])
                 # logger.info("identity_runners %s", identity_runners.keys())
                 for stimulus in req_tools:
@@ -104,6 +139,8 @@ class Manager(Component):
                         # logger.debug(action.to_json())
                     else:
                         logger.debug('stimulus of runner id %s not in component runners %s', stm_id, identity_runners)
+                if identity_features.get('barrier', False):
+                    inst.set('barrier', True)
                 logger.debug(inst.to_json())
                 peer = self.peers.get_by('uuid', str(req_id))
                 inst.to(peer.get_address(), prefix=peer.get_prefix())
@@ -116,41 +153,92 @@ class Manager(Component):
     def task(self, msg):
         logger.info('Task')
         logger.debug(msg.to_json())
+        if self.tasks.sched(msg):
+            logger.debug("New Task Trials - scheduled")
+            for trial in self.tasks.launch(msg.get_id()):
+                self.trial(msg, trial)
+        else:
+            logger.debug("Ongoing Task - already scheduled")
+
+    def trial(self, task, trial):
+        logger.info('Trial %s', trial)
         outputs = []
         agents = self.peers.get_by('role', 'agent', all=True)
         monitors = self.peers.get_by('role', 'monitor', all=True)
-        task_agents = msg.get('agents')
-        task_monitors = msg.get('monitors')
+        task_agents = task.get('agents')
+        task_monitors = task.get('monitors')
         instruct_agents = []
         instruct_monitors = []
+        trial_id = "%s:%s" % (task.get_id(), trial)
    
         if task_agents:
-            instruct_agents = self.instructions(agents, task_agents, _type='agent')
+            instruct_agents = self.instructions(agents, task_agents, _type='agent', trial_id=trial_id)
             if instruct_agents:
                 outputs.extend(instruct_agents)        
    
         if task_monitors:
-            instruct_monitors = self.instructions(monitors, task_monitors, _type='monitor')
+            instruct_monitors = self.instructions(monitors, task_monitors, _type='monitor', trial_id=trial_id)
             if instruct_monitors:
                 outputs.extend(instruct_monitors)
    
         if outputs:
-            if self.tasks.sched(msg):
-                logger.debug("New Task Trials - scheduled")
-            else:
-                logger.debug("Ongoing Task Trial - already scheduled")
-            self.sched_mapping(msg, outputs)
+            for output in outputs:
+                output.set('trial', trial)
+            trial_task = self.tasks.trial_input(task, trial)
+            self.sched_mapping(trial_task, outputs)
+            self.sched_barrier(trial_task, outputs)
         self.exit(outputs)
 
+    def sched_barrier(self, task, outputs):
+        input_id = (task.get_prefix(), task.get_id())
+        waits = [(output.get_prefix(), output.get_id())
+                 for output in outputs if output.get('barrier')]
+        self.barriers[input_id] = {
+            "wait": set(waits),
+            "ready": set(),
+            "start": time.monotonic(),
+            "released": None,
+        }
+
+    def ready(self, msg):
+        logger.info('Ready')
+        logger.debug(msg.to_json())
+        input_id = self.get_input_id(msg)
+        barrier = self.barriers.get(input_id, None)
+        if not barrier:
+            logger.info("Could not ack ready - no barrier for msg %s", msg.get_id())
+            return
+
+        barrier["ready"].add((msg.get_prefix(), msg.get_id()))
+        if barrier["ready"] >= barrier["wait"] and barrier["released"] is None:
+            barrier["released"] = time.monotonic()
+            logger.info("Barrier released - all %s instructions ready in %.3f s",
+                        len(barrier["wait"]), barrier["released"] - barrier["start"])
+            outputs = []
+            waits = self.get_waits(input_id)
+            for output_id in barrier["wait"]:
+                inst = waits.get(output_id)
+                release = Release(id=inst.get_id())
+                release.to(inst.get_to(), prefix=inst.get_prefix())
+                outputs.append(release)
+            self.exit(outputs)
+
+    def trial_timings(self, input_id):
+        barrier = self.barriers.pop(input_id, None)
+        if barrier:
+            end = time.monotonic()
+            released = barrier["released"] or barrier["start"]
+            logger.info("Trial timings: barrier %.3f s - run %.3f s - total %.3f s",
+                        released - barrier["start"], end - released, end - barrier["start"])
+
     def _process_snapshots(self, snaps):
         merge_snaps = []
-        trial_id = 0
-        for snap_pack in snaps:
+        for trial_id in sorted(snaps.keys()):
+            snap_pack = snaps[trial_id]
             for snap in snap_pack:
                 snap.set('trial', trial_id)
             
             merge_snaps.extend(snap_pack)
-            trial_id += 1
         return merge_snaps
 
     def report(self, task, snaps):
@@ -162,19 +250,20 @@ class Manager(Component):
         logger.debug(report.to_json())  
         return report
 
-    def task_status(self, task, snaps):
+    def task_status(self, trial_task, snaps):
         logger.info("Task status:")
-        ack = self.tasks.ack(task, snaps)
-        if ack:
-            has_next_trial = self.tasks.next_trial(task)
-            if has_next_trial:
-                trial, trials = self.tasks.info(task)
-                logger.info("Next Trial: id %s - total %s", trial, trials)
-                self.task(task)
+        task_id = self.tasks.ack(trial_task, snaps)
+        if task_id is not None:
+            if self.tasks.next_trial(task_id):
+                trial, trials = self.tasks.info(task_id)
+                logger.info("Trials acked: %s - total %s", trial, trials)
+                task = self.tasks.get_origin(task_id)
+                for trial in self.tasks.launch(task_id):
+                    self.trial(task, trial)
             else:
                 logger.info("All trials Ack")
-                orig_task, snaps_pack = self.tasks.checkout(task)
-                report = self.report(task, snaps_pack)
+                orig_task, snaps_pack = self.tasks.checkout(task_id)
+                report = self.report(orig_task, snaps_pack)
                 self.stamp_output(orig_task, report)
                 outputs = [report]
                 self.exit(outputs)
@@ -188,10 +277,11 @@ class Manager(Component):
             if self.check_all_acks(snap):
                 logger.debug('All instructions ack')
                 input_id = self.get_input_id(snap)
-                task = self.get_input(input_id)
+                trial_task = self.get_input(input_id)
                 snaps = self.get_acks(input_id)
+                self.trial_timings(input_id)
                 self.clear_mapping(input_id)
-                self.task_status(task, snaps)
+                self.task_status(trial_task, snaps)
             else:
                 logger.info("Not all snaps yet received")
         else:
@@ -217,5 +307,7 @@ class Manager(Component):
             self.task(msg)
         elif what == 'snapshot':
             self.snapshot(msg)
+        elif what == 'ready':
+            self.ready(msg)
         else:
             logger.debug('unknown msg-type %s', what)
\ No newline at end of file
@@ -5,6 +5,8 @@ import subprocess
 import time
 from datetime import datetime
 
+from gym.common.capture import Capture
+
 logger = logging.getLogger(__name__)
 
 
@@ -12,7 +14,8 @@ class Processor:
     def __init__(self):
         self.process = None
 
-    def start_process(self, args, stop=False, timeout=60):
+    def start_process(self, args, stop=False, timeout=60, consumer=None, size=None):
+        capture = Capture(consumer, size)
         try:
             p = subprocess.Popen(args,
                 stdin = subprocess.PIPE,
@@ -21,21 +24,25 @@ class Processor:
                 )
             self.process = p
             logger.info('process started %s', p.pid)
+            capture.start(p)
             if stop:
                 if self.stop_process(timeout):
-                    out, err = p.communicate()
+                    p.wait()
+                    out, err = capture.join()
                     return (p.returncode, out, err)
                 else:
                     self.process = None
                     return (-1, None, None)
             else:
-                out, err = p.communicate()
+                p.wait()
+                out, err = capture.join()
                 logger.info('process stopped %s', self.process.pid)
                 self.process = None
                 return (p.returncode, out, err)
-        except OSError:
+        except OSError as e:
+            logger.info('process could not start %s', e)
             self.process = None
-            return (-1, None, None)
+            return (-1, None, str(e).encode('UTF-8'))
 
     def stop_process(self, timeout):
         import ast
@@ -71,8 +78,8 @@ class Launcher:
                                         action="store_true",
                                         required=False)
 
-    def parse_args(self):
-        self._settings = self.parser.parse_args()
+    def parse_args(self, argv=None):
+        self._settings = self.parser.parse_args(argv)
         return self._settings
 
 
@@ -196,8 +203,8 @@ class Listener:
     def to_json(self, value):
         return json.dumps(value, sort_keys=True, indent=4)
 
-    def main(self):
-        settings = self._launcher.parse_args()
+    def main(self, argv=None):
+        settings = self._launcher.parse_args(argv)
         self.listen(settings)
         output = self.to_json(value=self._output)
         return output
\ No newline at end of file
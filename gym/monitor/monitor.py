@@ -1,7 +1,7 @@
 import os
 import logging
 
-from gym.common.process import Actuator
+from gym.common.process import AsyncActuator
 from gym.common.entity import Component
 from gym.common.messages import Evaluation, Snapshot, Error
 
@@ -13,14 +13,16 @@ class Monitor(Component):
     FILES_PREFIX = 'listener_'
     FILES_SUFFIX = 'py'
     CLASS_PREFIX = 'Listener'
+    EXECUTION = 'pool'
+    CACHE = '/tmp/gym-monitor-listeners.json'
 
     def __init__(self, info, in_q, out_q):
         Component.__init__(self, "monitor", in_q, out_q, info)
-        self.actuator = Actuator()
-        self.cfg_acts()
+        self.actuator = AsyncActuator()
+        self.cfg_acts(info)
         logger.info("Monitor Started: id %s - url %s", info.get("id"), info.get("url"))
 
-    def cfg_acts(self):
+    def cfg_acts(self, info=None):
         logger.info("Loading Listeners")
         folder = os.path.join(
             os.path.dirname(os.path.abspath(__file__)),
@@ -31,7 +33,14 @@ class Monitor(Component):
             "prefix": Monitor.FILES_PREFIX,
             "sufix": Monitor.FILES_SUFFIX,
             "full_path": True,
+            "class_prefix": Monitor.CLASS_PREFIX,
+            "cache": Monitor.CACHE,
+            "execution": Monitor.EXECUTION,
         }
+        # execution (pool or process), workers and deadline can be set in the cfg file
+        for key in ["execution", "workers", "deadline", "output_size"]:
+            if info and info.get(key) is not None:
+                cfg[key] = info.get(key)
         self.actuator.cfg(cfg)
 
     def origin(self):
@@ -78,9 +87,19 @@ class Monitor(Component):
     def instruction(self, msg):
         logger.info('Instruction')
         logger.debug(msg.to_json())
-        evals = self.actuator.act(msg)
+        self.spawn(self.execute(msg))
+
+    async def execute(self, msg):
+        try:
+            evals = await self.actuator.act(msg)
+        except Exception as e:
+            logger.debug("Exception on instruction execution: %s", e)
+            logger.exception(e)
+            # the manager still waits for this snapshot to complete the trial
+            evals = self.actuator.failed(msg, 'ERROR: instruction execution failed: %s' % e)
         evaluations = self.evaluations(evals)
         snap = self.snapshot(msg.get('id'), evaluations)
+        snap.set('trial', msg.get('trial'))
         self.stamp_output(msg, snap)
         outputs = [snap]
         self.exit(outputs)
@@ -1,10 +1,14 @@
 import os
+import json
+import time
+import heapq
 import logging
+from collections import deque
 logger = logging.getLogger(__name__)
 
 from gym.common.entity import Component, set_ev_handler
-from gym.common.messages import Report, Task, Deploy, Built, Result
-from gym.player.vnfbd import VNFBD
+from gym.common.messages import Message, rpc_map, Report, Task, Deploy, Built, Result, Error
+from gym.player.vnfbd import VNFBD, Capabilities
 from gym.player.vnfpp import VNFPP
 from gym.player.vnfbr import VNFBR
 from gym.common.events import EventResult
@@ -27,6 +31,7 @@ class Assistants:
         self._agents_metrics = {}
         self._monitors_metrics = {}
         self._full_info = {}
+        self._capabilities = {}
 
     def clear(self):
         self._managers.clear()
@@ -35,6 +40,17 @@ class Assistants:
         self._agents_metrics.clear()
         self._monitors_metrics.clear()
         self._full_info.clear()
+        self._capabilities.clear()
+
+    def capabilities(self, manager_id):
+        if manager_id not in self._capabilities:
+            self._capabilities[manager_id] = Capabilities()
+        return self._capabilities[manager_id]
+
+    def index_metrics(self, index, metrics, manager_id, key, value):
+        # metric -> manager -> (component, tool) -> value
+        for metric in metrics:
+            index.setdefault(metric, {}).setdefault(manager_id, {})[key] = value
 
     def get_manager_agent_metrics(self, manager):
         manager_id = manager['uuid']
@@ -56,12 +72,8 @@ class Assistants:
                             if prober_id not in self._agents[agent_id]['probers']:
                                 self._agents[agent_id]['probers'][prober_id] = {'metrics': metrics, 'parameters':parameters}
                             value = {'manager':manager_id, 'agent':agent_id, 'prober':prober_id, 'parameters':parameters}
-                            for metric in metrics:
-                                if metric not in self._agents_metrics:
-                                    self._agents_metrics[metric] = [value]
-                                else:
-                                    if value not in self._agents_metrics[metric]:
-                                        self._agents_metrics[metric].append(value)
+                            self.index_metrics(self._agents_metrics, metrics, manager_id, (agent_id, prober_id), value)
+                        self.capabilities(manager_id).add('agents', agent_id, self._agents[agent_id]['probers'])
 
     def get_manager_monitor_metrics(self, manager):
         manager_id = manager['uuid']
@@ -83,44 +95,66 @@ class Assistants:
                             if listener_id not in self._monitors[monitor_id]['listeners']:
                                 self._monitors[monitor_id]['listeners'][listener_id] = {'metrics': metrics, 'parameters':parameters}
                             value = {'manager': manager_id, 'monitor': monitor_id, 'listener': listener_id, 'parameters':parameters}
-                            for metric in metrics:
-                                if metric not in self._monitors_metrics:
-                                    self._monitors_metrics[metric] = [value]
-                                else:
-                                    if value not in self._monitors_metrics[metric]:
-                                        self._monitors_metrics[metric].append(value)
+                            self.index_metrics(self._monitors_metrics, metrics, manager_id, (monitor_id, listener_id), value)
+                        self.capabilities(manager_id).add('monitors', monitor_id, self._monitors[monitor_id]['listeners'])
 
     def add_manager_component(self, manager_id, type, component_id):
         if manager_id not in self._managers:
-            self._managers[manager_id] = {'id':manager_id, 'agents': [], 'monitors': []}
+            self._managers[manager_id] = {'id':manager_id, 'agents': {}, 'monitors': {}}
         if type == 'agent':
-            if component_id not in self._managers[manager_id]['agents']:
-                self._managers[manager_id]['agents'].append(component_id)
+            self._managers[manager_id]['agents'][component_id] = True
         if type == 'monitor':
-            if component_id not in self._managers[manager_id]['monitors']:
-                self._managers[manager_id]['monitors'].append(component_id)
+            self._managers[manager_id]['monitors'][component_id] = True
+
+    def remove(self, manager_id):
+        manager = self._managers.pop(manager_id, None)
+        self._full_info.pop(manager_id, None)
+        self._capabilities.pop(manager_id, None)
+        for index in [self._agents_metrics, self._monitors_metrics]:
+            for metric in list(index.keys()):
+                index[metric].pop(manager_id, None)
+                if not index[metric]:
+                    del index[metric]
+        if manager:
+            for type_, components in [('agents', self._agents), ('monitors', self._monitors)]:
+                for component_id in manager[type_]:
+                    if not any(component_id in other[type_] for other in self._managers.values()):
+                        components.pop(component_id, None)
+
+    def update(self, manager):
+        # replaces whatever was known about the manager with its latest info
+        manager_id = manager['uuid']
+        self.remove(manager_id)
+        self.get_manager_agent_metrics(manager)
+        self.get_manager_monitor_metrics(manager)
+        self.fill_manager_structure(manager_id)
 
     def fill_members(self, managers):
         for manager in managers:
-            self.get_manager_agent_metrics(manager)
-            self.get_manager_monitor_metrics(manager)
-        self.fill_full_structure()
+            self.update(manager)
+
+    def fill_manager_structure(self, manager_id):
+        if manager_id not in self._managers:
+            return
+        self._full_info[manager_id] = {"agents": [], "monitors": [],
+                                       "capabilities": self.capabilities(manager_id)}
+        monitors = self._managers[manager_id].get("monitors")
+        agents = self._managers[manager_id].get("agents")
+        for monitor_id in monitors:
+            monitor_info = self._monitors.get(monitor_id)
+            self._full_info[manager_id]["monitors"].append(monitor_info)
+        for agent_id in agents:
+            agent_info = self._agents.get(agent_id)
+            self._full_info[manager_id]["agents"].append(agent_info)
 
     def fill_full_structure(self):
         for manager_id in self._managers:
-            self._full_info[manager_id] = {"agents": [], "monitors": []}
-            monitors = self._managers[manager_id].get("monitors")
-            agents = self._managers[manager_id].get("agents")
-            for monitor_id in monitors:
-                monitor_info = self._monitors.get(monitor_id)
-                self._full_info[manager_id]["monitors"].append(monitor_info)
-            for agent_id in agents:
-                agent_info = self._agents.get(agent_id) 
-                self._full_info[manager_id]["agents"].append(agent_info)
-
-    def satisfy_structure(self, vnfbd):
+            self.fill_manager_structure(manager_id)
+
+    def satisfy_structure(self, vnfbd, managers=None):
         logger.debug('satisfy_structure')
-        for manager_id in self._managers.keys():
+        manager_ids = managers if managers is not None else list(self._managers.keys())
+        for manager_id in manager_ids:
             manager_info = self._full_info.get(manager_id)
             selected_components = vnfbd.satisfy_scenario(manager_info)
             if selected_components:
@@ -138,14 +172,22 @@ class Assistants:
     def monitors(self):
         return self._monitors
 
+    def _metrics(self, index):
+        metrics = {}
+        for metric, managers in index.items():
+            metrics[metric] = [value for values in managers.values() for value in values.values()]
+        return metrics
+
     def agents_metrics(self):
-        return self._agents_metrics
+        return self._metrics(self._agents_metrics)
 
     def monitors_metrics(self):
-        return self._monitors_metrics
+        return self._metrics(self._monitors_metrics)
 
     def metrics(self):
-        metrics = dict(self._monitors_metrics.items() + self._agents_metrics.items())
+        metrics = self.monitors_metrics()
+        for metric, values in self.agents_metrics().items():
+            metrics.setdefault(metric, []).extend(values)
         return metrics
 
 
@@ -164,6 +206,11 @@ class Controller(Component):
         self._vnfbd_db = {}
         self.cnet_plugin = None
         self.current_vnfbd_instance = None
+        self._occupancy = {}
+        self._dispatched = {}
+        self._pending = {}
+        self._unsatisfied = {}
+        self._vnfpp_logs = info.get("vnfpp_logs", None)
         self._load_vnfdbs()
 
     def _update_path(self):
@@ -191,6 +238,8 @@ class Controller(Component):
         del self._vnfbds[vnfbd_id]
         del self._vnfbd_vnfpp[vnfbd_id]
         del self._vnfpps[vnfpp_id]
+        self._pending.pop(vnfbd_id, None)
+        self._unsatisfied.pop(vnfbd_id, None)
         self.current_vnfbd_instance = None
 
     def end_layout(self):
@@ -226,6 +275,11 @@ class Controller(Component):
         result = Result()
         result.set("vnfbr", vnfbr)
         result.set("layout", layout)
+        unsatisfied = self._unsatisfied.get(vnfbd_id)
+        if unsatisfied:
+            # the vnf-br only holds the inputs that ran
+            error = Error(message="no manager satisfies vnf-bd inputs", data=unsatisfied)
+            result.set("error", error)
         self.send_event(EventResult(result))
         self.clean(vnfbd)
 
@@ -257,28 +311,79 @@ class Controller(Component):
             vnfpp_id = self._vnfbd_vnfpp.get(vnfbd_id)
             vnfpp = self._vnfpps.get(vnfpp_id)
             vnfbd = self._vnfbds.get(vnfbd_id)
-            vnfbd_instance = self.get_vnfbd_instance(vnfbd)
+            vnfbd_instance = self.get_vnfbd_instance(vnfbd, report_id)
             vnfpp.add_report(vnfbd_instance, report)
-            # vnfbd = self._vnfbds.get(vnfbd_id)
+            self.vacate(report_id)
             self.check(vnfbd)
              
         else:
             logger.info("could not find associated vnfbd for vnfbd_instance_id %s", report_id)
-            
-    def task(self, vnfbd_instance):
+
+    def occupy(self, manager_id, vnfbd_instance):
+        instance_id = vnfbd_instance.get_id()
+        self._occupancy[manager_id] = instance_id
+        self._dispatched[instance_id] = manager_id
+        logger.info("Manager %s running vnf-bd instance %s - busy managers %s/%s",
+                    manager_id, instance_id, len(self._occupancy), len(self.assistants.managers()))
+
+    def vacate(self, instance_id):
+        manager_id = self._dispatched.pop(instance_id, None)
+        if manager_id and self._occupancy.get(manager_id) == instance_id:
+            del self._occupancy[manager_id]
+
+    def free_managers(self):
+        managers = [manager_id for manager_id in self.assistants.managers().keys()
+                    if manager_id not in self._occupancy]
+        return managers
+
+    def in_flight(self, vnfbd):
+        instances = self._vnfbd_instances.get(vnfbd.get_id(), {})
+        running = [instance_id for instance_id in instances if instance_id in self._dispatched]
+        return running
+
+    def dispatch(self, vnfbd):
+        vnfbd_id = vnfbd.get_id()
+        free = self.free_managers()
+        while free:
+            vnfbd_instance = self._pending.pop(vnfbd_id, None)
+            if not vnfbd_instance:
+                if not vnfbd.has_next_input():
+                    break
+                vnfbd_instance = self.instantiate(vnfbd)
+
+            structure = self.assistants.satisfy_structure(vnfbd_instance, managers=free)
+            if structure:
+                manager_id, _ = structure
+                self.task(vnfbd_instance, structure=structure)
+                free.remove(manager_id)
+            elif self.in_flight(vnfbd):
+                # a busy manager may satisfy it once its current input is done
+                self._pending[vnfbd_id] = vnfbd_instance
+                break
+            else:
+                # no known manager satisfies it, the layout result reports it as an error
+                logger.info("could not dispatch vnf-bd instance %s - no manager satisfies it",
+                            vnfbd_instance.get_id())
+                self._unsatisfied.setdefault(vnfbd_id, []).append(vnfbd_instance.get_id())
+
+    def task(self, vnfbd_instance, structure=None):
         vnfbd_id = vnfbd_instance.get_id()
-        structure = self.assistants.satisfy_structure(vnfbd_instance)
+        if not structure:
+            structure = self.assistants.satisfy_structure(vnfbd_instance)
 
         if structure:
             logger.info("Creating task for vnf-bd id %s", vnfbd_id)
             manager_id, manager_components = structure
+            self.occupy(manager_id, vnfbd_instance)
          
             task = Task(id=vnfbd_id)
             
             test = vnfbd_instance.get_test()
             trials = vnfbd_instance.get_trials()
+            parallel = vnfbd_instance.get_parallel()
             task.set("test", test)
             task.set("trials", trials)            
+            task.set("parallel", parallel)
             logger.debug("test %s - trials %s", test, trials)
 
             agents = manager_components.get("agents", {})
@@ -316,9 +421,10 @@ class Controller(Component):
             return True
         return False
 
-    def get_vnfbd_instance(self, vnfbd):
+    def get_vnfbd_instance(self, vnfbd, vnfbd_instance_id=None):
         vnfbd_id = vnfbd.get_id()
-        vnfbd_instance_id = vnfbd.get_current_input_id()
+        if vnfbd_instance_id is None:
+            vnfbd_instance_id = vnfbd.get_current_input_id()
         if vnfbd_id in self._vnfbd_instances:
             if vnfbd_instance_id in self._vnfbd_instances[vnfbd_id]:
                 vnfbd_instance = self._vnfbd_instances[vnfbd_id][vnfbd_instance_id]
@@ -358,6 +464,16 @@ class Controller(Component):
         logger.info("deploying vnf-bd instance: id %s - request %s", instance_id, request)
         self.exit(outputs)
     
+    def vnfpp_log(self, vnfbd_id):
+        if self._vnfpp_logs:
+            if not os.path.exists(self._vnfpp_logs):
+                os.makedirs(self._vnfpp_logs)
+            filepath = os.path.join(self._vnfpp_logs, "vnfpp-" + str(vnfbd_id) + ".jsonl")
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return filepath
+        return None
+
     def load_vnfbd(self, filename, inputs):
         logger.info("build vnf-bd filename %s", filename)
         vnfbd = VNFBD()       
@@ -371,7 +487,7 @@ class Controller(Component):
             else:
                 vnfbd.multiplex_parameters(inputs)
                 self._vnfbds[vnfbd_id] = vnfbd
-                vnfpp = VNFPP()
+                vnfpp = VNFPP(log=self.vnfpp_log(vnfbd_id))
                 vnfpp.set_id(vnfbd_id)
                 vnfpp.parse_inputs(vnfbd.get_inputs())
                 self._vnfpps[vnfpp.get_id()] = vnfpp
@@ -385,8 +501,7 @@ class Controller(Component):
        
     def instantiate(self, vnfbd):
         vnfbd_instance_inputs = vnfbd.next_input()
-        vnfbd_instance = VNFBD()
-        vnfbd_instance.load(vnfbd.filename(), inputs=vnfbd_instance_inputs)
+        vnfbd_instance = vnfbd.instance(vnfbd_instance_inputs)
         vnfbd_instance.set_id(vnfbd_instance_inputs.get("id"))
         vnfbd_instance.set_test_id(vnfbd_instance_inputs.get("test"))
         self.register_vnfbd_instance(vnfbd, vnfbd_instance)
@@ -394,18 +509,21 @@ class Controller(Component):
         return vnfbd_instance
 
     def check(self, vnfbd):
-        if vnfbd.has_next_input():
-            vnfbd_instance = self.instantiate(vnfbd)
-
-            if vnfbd.environment_deploy():            
+        if vnfbd.environment_deploy():
+            if vnfbd.has_next_input():
+                vnfbd_instance = self.instantiate(vnfbd)
                 logger.info("deploying vnf-bd")
-                self.deploy(vnfbd_instance, "start")                
+                self.deploy(vnfbd_instance, "start")
             else:
-                logger.info("deploying vnf-bd")
-                self.task(vnfbd_instance)
+                logger.info("no more tests for vnf-bd: id %s", vnfbd.get_id())
+                self.finish(vnfbd)
         else:
-            logger.info("no more tests for vnf-bd: id %s", vnfbd.get_id())
-            self.finish(vnfbd)
+            # without a deployed environment, inputs run on every free manager that satisfies them
+            self.dispatch(vnfbd)
+            pending = vnfbd.get_id() in self._pending
+            if not vnfbd.has_next_input() and not pending and not self.in_flight(vnfbd):
+                logger.info("no more tests for vnf-bd: id %s", vnfbd.get_id())
+                self.finish(vnfbd)
 
     def init(self, layout):
         vnfbd_layout = layout.get("vnf_bd")
@@ -421,11 +539,13 @@ class Controller(Component):
                 logger.debug("starting vnf-bd: %s", vnfbd.to_json())
                 self._vnfbd_layout[vnfbd_id] = layout
                 self.check(vnfbd)
+                return True
             else:
                 logger.debug("processing layout ended for vnf-bd: id %s", vnfbd_id)
 
         else:
             logger.debug("vnf-bd id not registered in db %s", self._vnfbd_db.keys())
+        return False
 
     def ack(self, built):
         self.current_vnfbd_instance.ack_deploy()
@@ -458,9 +578,23 @@ class Controller(Component):
         return built
 
     def follow(self):
-        if self.current_vnfbd_instance:
-            self.current_vnfbd_instance.ack_info()
-            self.task(self.current_vnfbd_instance)
+        vnfbd_instance = self.current_vnfbd_instance
+        if vnfbd_instance:
+            vnfbd_instance.ack_info()
+            instance_id = vnfbd_instance.get_id()
+            vnfbd = self._vnfbds.get(self._vnfbd_ids.get(instance_id))
+            # only a deployed instance is tasked here, the others go through dispatch
+            if vnfbd and vnfbd.environment_deploy() and instance_id not in self._dispatched:
+                structure = self.assistants.satisfy_structure(vnfbd_instance, managers=self.free_managers())
+                if structure:
+                    self.task(vnfbd_instance, structure=structure)
+
+    def resume(self):
+        # layouts may arrive before any manager info, their inputs are dispatched once managers show up
+        for vnfbd in list(self._vnfbds.values()):
+            if not vnfbd.environment_deploy():
+                if vnfbd.get_id() in self._pending or vnfbd.has_next_input():
+                    self.dispatch(vnfbd)
 
 
 class Greets:
@@ -523,24 +657,166 @@ class Greets:
             return None
 
 
+class Layouts:
+    def __init__(self, filepath=None, limit=100):
+        self._filepath = filepath
+        self._limit = limit
+        self._heap = []
+        self._entries = {}
+        self._running = None
+        self._seq = 0
+        self._waits = deque(maxlen=1000)
+        self._counters = {"admitted": 0, "rejected": 0, "duplicated": 0, "done": 0}
+        self.load()
+
+    def _vnfbd_id(self, layout):
+        vnfbd_layout = layout.get("vnf_bd") or {}
+        return vnfbd_layout.get("id")
+
+    def _push(self, vnfbd_id, entry):
+        self._entries[vnfbd_id] = entry
+        # highest priority first, then arrival order
+        heapq.heappush(self._heap, (-entry["priority"], entry["seq"], vnfbd_id))
+        self._seq = max(self._seq, entry["seq"] + 1)
+
+    def put(self, layout):
+        vnfbd_id = self._vnfbd_id(layout)
+        if vnfbd_id in self._entries:
+            logger.info("Layout vnf-bd id %s already queued/running", vnfbd_id)
+            self._counters["duplicated"] += 1
+            return False
+
+        if len(self._heap) >= self._limit:
+            logger.info("Layout vnf-bd id %s rejected - queue full (%s)", vnfbd_id, self._limit)
+            self._counters["rejected"] += 1
+            return False
+
+        priority = layout.get("priority")
+        entry = {
+            "layout": layout,
+            "priority": int(priority) if priority else 0,
+            "time": time.time(),
+            "seq": self._seq,
+        }
+        self._push(vnfbd_id, entry)
+        self._counters["admitted"] += 1
+        self.save()
+        return True
+
+    def get(self):
+        while self._heap:
+            _, _, vnfbd_id = heapq.heappop(self._heap)
+            entry = self._entries.get(vnfbd_id, None)
+            if entry:
+                self._running = vnfbd_id
+                self._waits.append(time.time() - entry["time"])
+                self.save()
+                return entry["layout"]
+        return None
+
+    def done(self, layout):
+        vnfbd_id = self._vnfbd_id(layout)
+        if self._entries.pop(vnfbd_id, None):
+            self._counters["done"] += 1
+        if self._running == vnfbd_id:
+            self._running = None
+        self.save()
+
+    def depth(self):
+        return len(self._heap)
+
+    def metrics(self):
+        now = time.time()
+        waits = list(self._waits)
+        queued = [entry["time"] for vnfbd_id, entry in self._entries.items()
+                  if vnfbd_id != self._running]
+        metrics = {
+            "depth": self.depth(),
+            "limit": self._limit,
+            "running": self._running,
+            "oldest": now - min(queued) if queued else 0.0,
+            "wait": {
+                "last": waits[-1] if waits else 0.0,
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "max": max(waits) if waits else 0.0,
+            },
+        }
+        metrics.update(self._counters)
+        return metrics
+
+    def save(self):
+        if not self._filepath:
+            return
+        entries = []
+        for vnfbd_id, entry in self._entries.items():
+            layout = entry["layout"]
+            entries.append({
+                "vnfbd": vnfbd_id,
+                "layout": layout.to_json(),
+                "prefix": layout.get_prefix(),
+                "priority": entry["priority"],
+                "time": entry["time"],
+                "seq": entry["seq"],
+            })
+        try:
+            tmp = self._filepath + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp, self._filepath)
+        except OSError as e:
+            logger.debug("Could not save layouts queue %s: %s", self._filepath, e)
+
+    def load(self):
+        if not self._filepath or not os.path.exists(self._filepath):
+            return
+        try:
+            with open(self._filepath, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.debug("Could not load layouts queue %s: %s", self._filepath, e)
+            return
+
+        # layouts running when the player stopped are queued again
+        for item in entries:
+            layout = Message.parse(item.get("layout"), rpc_map)
+            if layout:
+                layout.set_prefix(item.get("prefix"))
+                entry = {
+                    "layout": layout,
+                    "priority": item.get("priority", 0),
+                    "time": item.get("time", time.time()),
+                    "seq": item.get("seq", self._seq),
+                }
+                self._push(item.get("vnfbd"), entry)
+        logger.info("Loaded layouts queue - depth %s", self.depth())
+
+
 class Player(Controller):
+    QUEUE_LIMIT = 100
+
     def __init__(self, info, in_q, out_q):
         Controller.__init__(self, "player", in_q, out_q, info)
         self.greets = Greets()
-        self.storage = Storage()
+        self.storage = Storage(info.get("storage", ['disk']), settings=info.get("storage_settings"))
         self.state = "available"
+        # queued layouts are only kept across restarts if a queue_file is set in the cfg
+        self.layouts = Layouts(info.get("queue_file"), limit=info.get("queue_limit", Player.QUEUE_LIMIT))
         
-    def update_info(self):
+    def update_info(self, peer=None):
         logger.debug('updating peers info')
-        managers = self.peers.get_by('role', 'manager', all=True)
+        if peer:
+            managers = [peer] if peer.get('role') == 'manager' else []
+        else:
+            managers = self.peers.get_by('role', 'manager', all=True)
         mgrs = [peer.info() for peer in managers]
-        # logger.debug(mgrs)
         try:
-            self.assistants.fill_members(mgrs)      
+            self.assistants.fill_members(mgrs)
         except Exception as e:
             logger.debug(e)
         finally:
             self.follow()
+            self.resume()
+            self.queued()
         
     def built(self, msg):
         logger.info("handling built message")
@@ -566,11 +842,22 @@ class Player(Controller):
     def layout(self, layout):
         logger.info("handling layout message")
         logger.debug(layout.to_json())
-        if self.state == "available":
-            self.state = "busy"
-            self.init(layout)
+        if self.layouts.put(layout):
+            logger.info("Layout queued - queue depth %s", self.layouts.depth())
+            self.queued()
         else:
-            logger.info("Layout not processed - vnf-bd in execution")
+            logger.info("Layout not queued")
+
+    def queued(self):
+        while self.state == "available":
+            layout = self.layouts.get()
+            if not layout:
+                break
+            self.state = "busy"
+            if not self.init(layout):
+                logger.info("Layout dropped - vnf-bd could not be started")
+                self.layouts.done(layout)
+                self.state = "available"
 
     def report(self, report):
         logger.info("handling report message")
@@ -589,8 +876,12 @@ class Player(Controller):
         self.exit(outputs)
         self.storage.store(result)
         logger.info("ended vnf-bd execution")
+        self.layouts.done(layout)
         self.state = "available"
-        # self.queued()
+        self.queued()
+
+    def queue_info(self):
+        return self.layouts.metrics()
 
     def status(self):
         logger.debug('status')
@@ -3,13 +3,15 @@ logger = logging.getLogger(__name__)
 
 import os 
 import json 
+import asyncio
 
 from gym.common.es.es import ES
+from gym.common.es.bulk import Bulk
 
 
 class StorageES:
-    def __init__(self):
-        self.es = ES()
+    def __init__(self, hosts='172.17.0.1:9200'):
+        self.es = ES(hosts=hosts)
 
     def _parse(self, item):
         _index = item.get('where', None)
@@ -58,9 +60,9 @@ class StorageES:
 
 
 class StorageDisk:
-    def __init__(self):
+    def __init__(self, folder="./vnfbr/"):
         self.filename = None
-        self.folder = "./vnfbr/"
+        self.folder = folder
         # self.folder = "../../vnfbr/"
 
     def filepath(self, filename):
@@ -97,25 +99,81 @@ class StorageDisk:
             logger.info('error: vnfbr NOT %s stored', index_id)
 
 
+class StorageBulk:
+    def __init__(self, **settings):
+        self.bulk = Bulk(**settings)
+        self._tasks = set()
+
+    async def _store(self, index_id, vnfbr):
+        if await self.bulk.store(vnfbr):
+            logger.info('ok: vnfbr %s stored', index_id)
+        else:
+            logger.info('error: vnfbr NOT %s stored', index_id)
+
+    async def _store_once(self, index_id, vnfbr):
+        try:
+            await self._store(index_id, vnfbr)
+        finally:
+            await self.bulk.close()
+
+    def store(self, result):
+        logger.debug("Elasticsearch Bulk Store VNF-BR")
+        index_id = result.get_id()
+        vnfbr = result.get("vnfbr")
+        if not vnfbr:
+            logger.info('error: vnfbr NOT %s stored', index_id)
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+
+        if loop:
+            task = loop.create_task(self._store(index_id, vnfbr))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        else:
+            asyncio.run(self._store_once(index_id, vnfbr))
+
+
+class StorageParquet:
+    def __init__(self, folder="./parquet/"):
+        self.folder = folder
+
+    def store(self, result):
+        logger.debug("Parquet Store VNF-BR")
+        index_id = result.get_id()
+        vnfbr = result.get("vnfbr")
+
+        if vnfbr and vnfbr.to_parquet(self.folder):
+            logger.info('ok: vnfbr %s stored', index_id)
+        else:
+            logger.info('error: vnfbr NOT %s stored', index_id)
+
+
 class Storage:
     MODES = {
         "disk": StorageDisk,
         "elastic": StorageES,
+        "parquet": StorageParquet,
+        "bulk": StorageBulk,
     }
     
-    def __init__(self, defaults=['disk']):
-        self.modes = []
+    def __init__(self, defaults=['disk'], settings=None):
+        self.modes = {}
+        self.settings = settings if settings else {}
         self.load_modes(defaults)
 
     def load_modes(self, modes):
+        # backends are created once and reused for every vnf-br stored
         for mode in modes:
             if mode in Storage.MODES:
                 if mode not in self.modes:
-                    self.modes.append(Storage.MODES[mode])
-        logger.info("Storage modes set %s", self.modes)
+                    self.modes[mode] = Storage.MODES[mode](**self.settings.get(mode, {}))
+        logger.info("Storage modes set %s", list(self.modes.keys()))
 
     def store(self, vnfbr):
-        for storage in self.modes:
-            db = storage()
+        for db in self.modes.values():
             db.store(vnfbr)
         return True
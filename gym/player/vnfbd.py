@@ -3,8 +3,11 @@ import os
 import re
 import copy
 import yaml
+import pickle
+import hashlib
 import itertools
 from functools import reduce
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
@@ -14,13 +17,183 @@ try:
 except ImportError:
     from yaml import Loader, Dumper
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, nodes
 
 from gym.common.info import Content
 
 ETC_REL_PATH = '../etc/db/vnf-bd/'
 
 
+class TemplateCache:
+    def __init__(self, size=256):
+        self._size = size
+        self._environments = {}
+        self._templates = OrderedDict()
+        self._parsed = OrderedDict()
+
+    def clear(self):
+        self._environments.clear()
+        self._templates.clear()
+        self._parsed.clear()
+
+    def _put(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self._size:
+            cache.popitem(last=False)
+
+    def environment(self, folder):
+        env = self._environments.get(folder, None)
+        if not env:
+            env = Environment(loader=FileSystemLoader(folder),
+                              bytecode_cache=FileSystemBytecodeCache())
+            self._environments[folder] = env
+        return env
+
+    def template(self, folder, filename):
+        filepath = os.path.join(folder, filename)
+        key = (filepath, os.path.getmtime(filepath))
+        template = self._templates.get(key, None)
+        if template:
+            self._templates.move_to_end(key)
+        else:
+            template = self.environment(folder).get_template(filename)
+            self._put(self._templates, key, template)
+        return template
+
+    def parse(self, rendered):
+        # callers own what they get, so parses are kept pickled: a miss hands out
+        # the fresh parse and a hit unpickles its own copy (much cheaper than deepcopy)
+        key = hashlib.sha1(rendered).hexdigest()
+        cached = self._parsed.get(key, None)
+        if cached is None:
+            data = load(rendered, Loader=Loader)
+            self._put(self._parsed, key, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+            return data
+        self._parsed.move_to_end(key)
+        return pickle.loads(cached)
+
+
+templates = TemplateCache()
+
+
+class TemplatePatcher:
+    SENTINEL = "__gym_input_{0}__"
+    UNSAFE = re.compile(r'[\n"\'\\]|: | #|^[\[\]{}&*!|>%@`,?-]')
+
+    def __init__(self, parser, folder, filename, inputs, paths):
+        self._paths = paths
+        self._sentinels = [TemplatePatcher.SENTINEL.format(i) for i in range(len(paths))]
+        self._base = None
+        self._patches = []
+        self._scalars = {}
+        self.ready = self._build(parser, folder, filename, inputs)
+
+    def _chain(self, node):
+        if isinstance(node, nodes.Name):
+            return [node.name]
+        if isinstance(node, nodes.Getattr):
+            path = self._chain(node.node)
+            return path + [node.attr] if path is not None else None
+        if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const):
+            path = self._chain(node.node)
+            return path + [node.arg.value] if path is not None else None
+        return None
+
+    def _check_refs(self, node, output=False):
+        path = self._chain(node)
+        if path is not None:
+            for input_path in self._paths:
+                size = min(len(path), len(input_path))
+                if path[:size] == input_path[:size]:
+                    # varying inputs can only be printed as is, e.g. {{ sut.image }}
+                    if not output or path != input_path:
+                        return False
+            return True
+        for child in node.iter_child_nodes():
+            if not self._check_refs(child, output=isinstance(node, nodes.Output)):
+                return False
+        return True
+
+    def _walk(self, node, data, path):
+        if isinstance(node, yaml.MappingNode):
+            if not isinstance(data, dict) or len(node.value) != len(data):
+                return False
+            for (key_node, value_node), (key, value) in zip(node.value, data.items()):
+                if any(sentinel in str(key) for sentinel in self._sentinels):
+                    return False
+                if not self._walk(value_node, value, path + [key]):
+                    return False
+        elif isinstance(node, yaml.SequenceNode):
+            if not isinstance(data, list) or len(node.value) != len(data):
+                return False
+            for index, (value_node, value) in enumerate(zip(node.value, data)):
+                if not self._walk(value_node, value, path + [index]):
+                    return False
+        elif isinstance(data, str):
+            used = [i for i, sentinel in enumerate(self._sentinels) if sentinel in data]
+            if used:
+                self._patches.append((path, data, not node.style, used))
+        return True
+
+    def _build(self, parser, folder, filename, inputs):
+        env = templates.environment(parser._full_path(folder))
+        try:
+            source = env.loader.get_source(env, filename)[0]
+            if not self._check_refs(env.parse(source)):
+                logger.debug("vnf-bd template uses varying inputs in expressions - no patching")
+                return False
+
+            sentinel_inputs = copy.deepcopy(inputs)
+            for input_path, sentinel in zip(self._paths, self._sentinels):
+                reduce(dict.__getitem__, input_path[:-1], sentinel_inputs)[input_path[-1]] = sentinel
+            rendered = parser._render_template(filename, folder, sentinel_inputs)
+            self._base = load(rendered, Loader=Loader)
+            tree = yaml.compose(rendered, Loader=Loader)
+        except Exception as e:
+            logger.debug("vnf-bd template could not be prepared for patching: %s", e)
+            return False
+
+        if not self._walk(tree, self._base, []):
+            return False
+        found = sum(len(used) for _, text, _, used in self._patches)
+        occurrences = sum(rendered.decode('utf8').count(sentinel) for sentinel in self._sentinels)
+        # every sentinel must end up in a scalar value, otherwise patching is not exact
+        return found == occurrences
+
+    def _scalar(self, text):
+        if text not in self._scalars:
+            self._scalars[text] = load(text, Loader=Loader) if text else None
+        return self._scalars[text]
+
+    def patch(self, inputs):
+        values = []
+        for input_path in self._paths:
+            value = reduce(dict.get, input_path[:-1], inputs).get(input_path[-1])
+            if isinstance(value, (dict, list, tuple)) or TemplatePatcher.UNSAFE.search(str(value)):
+                return None
+            values.append(str(value))
+
+        root = copy.copy(self._base)
+        copies = {(): root}
+        for path, text, plain, used in self._patches:
+            for i in used:
+                text = text.replace(self._sentinels[i], values[i])
+            value = self._scalar(text) if plain else text
+            if isinstance(value, (dict, list)):
+                return None
+
+            # copies only the containers along the path, the rest is shared with the base
+            node = root
+            for depth, key in enumerate(path[:-1]):
+                prefix = tuple(path[:depth + 1])
+                if prefix not in copies:
+                    copies[prefix] = copy.copy(node[key])
+                    node[key] = copies[prefix]
+                node = copies[prefix]
+            node[path[-1]] = value
+        return root
+
+
 class TemplateParser:
     def __init__(self):
         self.tmp_configs = None
@@ -30,7 +203,7 @@ class TemplateParser:
         inputs = inputs if inputs else {}        
         logger.info("Parsing template %s - %s", folder, filename)
         rendered = self._render_template(filename, folder, inputs)
-        rendered_dict = load(rendered, Loader=Loader)
+        rendered_dict = templates.parse(rendered)
         # logger.debug("Rendered template %s", rendered_dict)
         return rendered_dict
 
@@ -59,12 +232,53 @@ class TemplateParser:
 
     def _render_template(self, template_file, temp_dir, context):
         j2_tmpl_path = self._full_path(temp_dir)
-        j2_env = Environment(loader=FileSystemLoader(j2_tmpl_path))
-        j2_tmpl = j2_env.get_template(template_file)
+        j2_tmpl = templates.template(j2_tmpl_path, template_file)
         rendered = j2_tmpl.render(dict(temp_dir=temp_dir, **context))
         return rendered.encode('utf8')
 
 
+class Capabilities:
+    def __init__(self):
+        self._tools = {}
+        self._queries = {}
+
+    @classmethod
+    def build(cls, components, component_type):
+        capabilities = cls()
+        tool_type = 'probers' if component_type == 'agents' else 'listeners'
+        for component in components:
+            capabilities.add(component_type, component.get('id'), component.get(tool_type, {}))
+        return capabilities
+
+    def add(self, component_type, component_id, tools):
+        self.remove(component_type, component_id)
+        for tool_id, tool in tools.items():
+            key = (component_type, tool_id)
+            self._tools.setdefault(key, {})[component_id] = frozenset(tool.get('parameters', []))
+        self._queries.clear()
+
+    def remove(self, component_type, component_id):
+        for (_type, _), components in self._tools.items():
+            if _type == component_type:
+                components.pop(component_id, None)
+        self._queries.clear()
+
+    def tools(self, component_type, component_id):
+        tools = {}
+        for (_type, tool_id), components in self._tools.items():
+            if _type == component_type and component_id in components:
+                tools[tool_id] = {'parameters': list(components[component_id])}
+        return tools
+
+    def candidates(self, component_type, tool_id, parameters):
+        key = (component_type, tool_id, frozenset(parameters))
+        if key not in self._queries:
+            components = self._tools.get((component_type, tool_id), {})
+            self._queries[key] = set(component_id for component_id, params in components.items()
+                                     if key[2] <= params)
+        return self._queries[key]
+
+
 class Scenario(Content):
     def __init__(self):
         Content.__init__(self)
@@ -97,7 +311,7 @@ class Scenario(Content):
     def check_nodes(self, structure, type_="agents"):
         available = structure.get(type_, [])
         required = self._proceedings.get(type_, [])
-        logger.info("available %s and required %s", available, required)    
+        logger.debug("available %s and required %s", available, required)
         if required:
             req = True
             if len(required) <= len(available):
@@ -147,7 +361,7 @@ class Scenario(Content):
     def _check_components_params(self, req_component_tools, aval_component_tools):
         if all([True if tool.get("id") in aval_component_tools.keys() else False
                 for tool in req_component_tools]):
-            logger.info("All component tools id ack")
+            logger.debug("All component tools id ack")
             ack_req_tools = []
             ack_req_tool_ids = []
             
@@ -158,7 +372,7 @@ class Scenario(Content):
                 
                 req_params = self.parse_req_tool_params(req_params_ls)
                 
-                logger.info("aval_params %s - req_params %s", aval_params, req_params)
+                logger.debug("aval_params %s - req_params %s", aval_params, req_params)
                 #Checks if all params in req prober/listener is contained in available tools params
                 if all([True if param in aval_params else False for param in req_params.keys()]):            
                     ack_req_tool = {
@@ -185,66 +399,75 @@ class Scenario(Content):
                         aval_component_tools, req_component_tools)
         return None
 
+    def _match(self, candidates):
+        # bipartite matching (Kuhn), required components with fewer candidates go first
+        matched = {}
+
+        def augment(req_id, seen):
+            for aval_id in candidates[req_id]:
+                if aval_id not in seen:
+                    seen.add(aval_id)
+                    if aval_id not in matched or augment(matched[aval_id], seen):
+                        matched[aval_id] = req_id
+                        return True
+            return False
+
+        for req_id in sorted(candidates, key=lambda req_id: len(candidates[req_id])):
+            if not augment(req_id, set()):
+                return None
+        return dict((req_id, aval_id) for aval_id, req_id in matched.items())
+
     def _check_components(self, availables, component_type):
         logger.info("Checking components/tools/params")
         required_components = self._proceedings.get(component_type)
         available_components = availables.get(component_type)
         component_tool_type = 'probers' if component_type == 'agents' else 'listeners'
-
-        selected_ids = {}
-        selected_components = {}
         logger.debug('check_components type %s subtype %s',
                      component_type, component_tool_type)
-        # logger.debug("required_components %s", required_components)
-        # logger.debug("available_components %s", available_components)
 
-        available_components_ids = dict( [ (available_component.get('id'),available_component)  for available_component in available_components ] )
-        # logger.info("available_components_ids %s", available_components_ids)
+        capabilities = availables.get('capabilities', None)
+        if not capabilities:
+            capabilities = Capabilities.build(available_components, component_type)
+        available_ids = set(available_component.get('id') for available_component in available_components)
+
+        candidates = {}
+        required_tools = {}
         for required_component in required_components:
             req_id = required_component.get("id")
+            req_component_tools = required_component.get(component_tool_type)
+
+            #Required component ids matching an available component id are a mandatory mapping
+            aval_ids = set([req_id]) if req_id in available_ids else set(available_ids)
+            for tool in req_component_tools:
+                req_params = self.parse_req_tool_params(tool.get("parameters"))
+                aval_ids &= capabilities.candidates(component_type, tool.get("id"), req_params.keys())
+                if not aval_ids:
+                    break
+
+            if not aval_ids:
+                logger.debug('no available component satisfies %s tools %s', req_id, req_component_tools)
+                return None
 
-            #Checks if req_id is already mapped directly to available_id component - i.e., mandatory mapping
-            if req_id in available_components_ids:
-                available_component = available_components_ids.get(req_id)
-                aval_id = req_id
-                if req_id not in selected_ids and aval_id not in selected_ids.values():
-                    req_component_tools = required_component.get(component_tool_type)
-                    aval_component_tools = available_component.get(component_tool_type)
-
-                    ack_req_component_tools = self._check_components_params(req_component_tools, aval_component_tools)
-                    # Maps component_id (agent_id or monitor_id) to required tool and its params
-                    if ack_req_component_tools:
-                        selected_components[req_id] = ack_req_component_tools
-                        selected_ids[req_id] = aval_id
-                    else:
-                        logger.debug('component %s with items %s does not satisfy %s',
-                                    available_component, aval_component_tools, req_component_tools)
-            else:
-                for available_component in available_components:
-                    aval_id = available_component.get("id")
-
-                    if req_id not in selected_ids and aval_id not in selected_ids.values():
-                        req_component_tools = required_component.get(component_tool_type)
-                        aval_component_tools = available_component.get(component_tool_type)
-
-                        ack_req_component_tools = self._check_components_params(req_component_tools, aval_component_tools)
-                        if ack_req_component_tools:
-                            selected_components[req_id] = ack_req_component_tools
-                            selected_ids[req_id] = aval_id
-                            break
-                        else:
-                            logger.debug('component %s with items %s does not satisfy %s',
-                                        available_component, aval_component_tools, req_component_tools)
-
-        req_choices = selected_ids.keys()
-        if all([True if req.get("id") in req_choices else False for req in required_components]):
-            logger.debug("All components, tools, and params - successfully selected")
-            return selected_components
-        logger.debug("NOT all components, tools, and params - selected")
-        return None
+            candidates[req_id] = sorted(aval_ids, key=str)
+            required_tools[req_id] = req_component_tools
+
+        selected_ids = self._match(candidates)
+        if selected_ids is None:
+            logger.debug("NOT all components, tools, and params - selected")
+            return None
+
+        # Maps the matched component_id (agent_id or monitor_id) to required tools and their params
+        selected_components = {}
+        for req_id, aval_id in selected_ids.items():
+            aval_component_tools = capabilities.tools(component_type, aval_id)
+            selected_components[aval_id] = self._check_components_params(required_tools[req_id], aval_component_tools)
+        logger.debug("All components, tools, and params - successfully selected %s", selected_ids)
+        return selected_components
 
 
 class VNFBD(Content):
+    PATCHING = True
+
     def __init__(self):
         Content.__init__(self)
         self.id = None
@@ -262,7 +485,13 @@ class VNFBD(Content):
         self._filename = None
         self._etc_folder = ETC_REL_PATH
         self._parser = TemplateParser()
-        self._mux_inputs = {}
+        self._mux_inputs = None
+        self._mux_paths = []
+        self._mux_radices = []
+        self._mux_tests = 1
+        self._mux_total = 0
+        self._input_start = 500
+        self._patcher = None
         self._deployed = False
         self._informed = False
         self._first_input = True
@@ -290,6 +519,10 @@ class VNFBD(Content):
         trials = self.experiments.get("trials")
         return trials
 
+    def get_parallel(self):
+        parallel = self.experiments.get("parallel", 1)
+        return parallel
+
     def get_test(self):
         return self._test_id
 
@@ -450,21 +683,60 @@ class VNFBD(Content):
         return unique_inputs
 
     def multiplex_parameters(self, inputs):
-        # mux_inputs = self.multiplex_inputs(inputs)
-        mux_inputs = self.mix_inputs(inputs)
-        logger.debug("Multiplexed vnfbd inputs %s", mux_inputs)
-        self._input_ids = 500
-
-        tests = self.experiments.get("tests", 1)
-        for _input in mux_inputs:
-            for test_id in range(tests):
-                _input_test = copy.deepcopy(_input)
-                _input_test["test"] = test_id
-                self._mux_inputs[self._input_ids] = _input_test
-                self._input_ids += 1
-
-        logger.debug("vnf-bd tests %s - total inputs %s", tests, len(self._mux_inputs))
-        self._input_ids = 500
+        # inputs are not materialized, each one is built from its index on demand
+        list_paths = self.lists_paths(inputs)
+        self._mux_inputs = inputs
+        self._mux_paths = list_paths
+        self._mux_radices = [len(lists) for lists in self.get_lists(list_paths)]
+        self._mux_tests = self.experiments.get("tests", 1)
+
+        combinations = reduce(lambda a, b: a * b, self._mux_radices, 1)
+        self._mux_total = combinations * self._mux_tests
+        self._input_ids = self._input_start
+
+        if VNFBD.PATCHING:
+            paths = [list_fields[0:-1] for list_fields in list_paths]
+            paths.extend([["id"], ["test"]])
+            self._patcher = TemplatePatcher(self._parser, self._update_path(),
+                                            self._filename, inputs, paths)
+            logger.info("vnf-bd instances by patching: %s", self._patcher.ready)
+
+        logger.debug("vnf-bd tests %s - total inputs %s", self._mux_tests, self._mux_total)
+
+    def instance(self, inputs):
+        vnfbd_instance = VNFBD()
+        data = None
+        if self._patcher and self._patcher.ready:
+            data = self._patcher.patch(inputs)
+        if data is not None:
+            # instances share the unchanged parts of the parsed base, they must not modify them
+            vnfbd_instance._filename = self._filename
+            vnfbd_instance._inputs = inputs
+            vnfbd_instance._init(**data)
+        else:
+            vnfbd_instance.load(self._filename, inputs=inputs)
+        return vnfbd_instance
+
+    def mux_input(self, input_id):
+        index = input_id - self._input_start
+        if index < 0 or index >= self._mux_total:
+            return None
+
+        # tests vary fastest, then the last list value as in itertools.product
+        combination, test_id = divmod(index, self._mux_tests)
+        positions = []
+        for radix in reversed(self._mux_radices):
+            combination, position = divmod(combination, radix)
+            positions.append(position)
+        positions.reverse()
+
+        mux_input = copy.deepcopy(self._mux_inputs)
+        for list_fields, position in zip(self._mux_paths, positions):
+            path = list_fields[0:-2]
+            value = {list_fields[-2]: list_fields[-1][position]}
+            self.set_dict_path(mux_input, path, value)
+        mux_input["test"] = test_id
+        return mux_input
 
     def get_current_input_id(self):
         return self._input_ids
@@ -475,7 +747,8 @@ class VNFBD(Content):
         else:
             next_input_id = self._input_ids + 1
 
-        if next_input_id in self._mux_inputs:
+        index = next_input_id - self._input_start
+        if 0 <= index < self._mux_total:
             return True
         return False
 
@@ -487,14 +760,15 @@ class VNFBD(Content):
         else:
             next_input_id = self._input_ids + 1
         
-        if next_input_id in self._mux_inputs:
-            next_input = self._mux_inputs.get(next_input_id)
+        mux_input = self.mux_input(next_input_id)
+        if mux_input is not None:
+            next_input = mux_input
             #Defines Id that will be used by vnfbd instance of such current_input
             next_input["id"] = next_input_id
             self._input_ids = next_input_id     
         
         logger.debug("vnf-bd next input %s", next_input)
-        logger.info("vnf-bd input id %s - total %s", next_input, len(self._mux_inputs))
+        logger.info("vnf-bd input id %s - total %s", next_input.get("id"), self._mux_total)
         return next_input
 
     def environment_deploy(self):
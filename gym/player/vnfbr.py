@@ -3,17 +3,28 @@ logger = logging.getLogger(__name__)
 
 import os
 import json
+import numpy as np
 import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+    from pyarrow.fs import LocalFileSystem
+except ImportError:
+    pa = None
 
 from gym.common.info import Content
 
 
 class VNFBR(Content):
+    QUANTILES = [0.25, 0.5, 0.75]
+    PARTITIONS = ["test", "trial", "source"]
+
     def __init__(self, vnfbr_id):
         Content.__init__(self)
         self.id = vnfbr_id
         self.vnfpp = {}
         self.vnfbd = {}
+        self._dataset = None
 
     def set_attrib(self, attrib, data):
         if attrib == "vnfbd":
@@ -23,105 +34,192 @@ class VNFBR(Content):
         else:
             logger.info("unknown vnfbr attrib %s", attrib)
 
-    def _extract_metrics(self, metrics, prefix, source, save=False):
-        metrics_summary = {}     
-
-        columns = [metric.get("name") for metric in metrics]
-        data = { metric.get("name"):metric.get("value") for metric in metrics }
-        df = pd.DataFrame(data=data)
-        
-        for metric_name in columns:
-            desc = df[metric_name].describe()
-            dict_desc = desc.to_dict()
-            col_metrics = { "_".join([metric_name, k]):v for k,v in dict_desc.items() }
-            metrics_summary.update(col_metrics)
-
-        if save:
-            dirname = "./csv"
-            filename = "_".join([prefix, source.get("type"), source.get("name"), ".csv"])
+    def _series(self, value):
+        try:
+            return np.asarray(value, dtype=float).ravel()
+        except (TypeError, ValueError):
+            logger.debug("series values not numeric - discarded")
+            return np.empty(0)
+
+    def _collect(self, reports):
+        # a single pass over reports: scalar metrics go into one row per
+        # (report, trial), series values into flat chunks keyed by their row
+        rows, prefixes, inputs = [], [], []
+        row_ids = {}
+        chunks = []
+        keys = {"row": [], "role": [], "source": [], "metric": []}
+
+        for report_index, report in enumerate(reports):
+            report_id = report.get("id")
+            report_test = report.get("test")
+            report_inputs = report.get("inputs") or {}
+
+            for snap in report.get("snapshots"):
+                snap_trial = snap.get("trial")
+                snap_role = snap.get("origin").get("role")
+
+                row_key = (report_index, snap_trial)
+                if row_key not in row_ids:
+                    row_ids[row_key] = len(rows)
+                    rows.append({"test": report_test, "trial": snap_trial})
+                    prefixes.append("_".join(["report", str(report_id), "test", str(report_test), "trial", str(snap_trial)]))
+                    inputs.append({"input_" + k: v for k, v in report_inputs.items()})
+                row_id = row_ids[row_key]
+
+                for ev in snap.get("evaluations"):
+                    ev_metrics = ev.get("metrics")
+                    if type(ev_metrics) is not list:
+                        continue
+                    source = ev.get("source")
+                    source_key = "_".join([str(source.get("type")), str(source.get("name"))])
+                    for metric in ev_metrics:
+                        if metric.get("series"):
+                            chunks.append(self._series(metric.get("value")))
+                            keys["row"].append(row_id)
+                            keys["role"].append(snap_role)
+                            keys["source"].append(source_key)
+                            keys["metric"].append(metric.get("name"))
+                        else:
+                            rows[row_id]["metric_" + snap_role + "_" + metric.get("name")] = metric.get("value")
+
+        return rows, prefixes, inputs, self._long(chunks, keys)
+
+    def _long(self, chunks, keys):
+        # long format: one line per series value, string keys as categoricals
+        if not chunks:
+            return None
+        lengths = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+        total = int(lengths.sum())
+        starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        series = {
+            "row": np.repeat(np.array(keys["row"], dtype=np.int64), lengths),
+            "position": np.arange(total, dtype=np.int64) - starts,
+            "value": np.concatenate(chunks),
+        }
+        for key in ["role", "source", "metric"]:
+            codes, uniques = pd.factorize(pd.Series(keys[key], dtype=object))
+            series[key] = pd.Categorical.from_codes(np.repeat(codes, lengths), categories=uniques)
+        return pd.DataFrame(series)
+
+    def _summarize(self, series):
+        # same statistics as describe(), with grouped (cythonized) aggregations
+        grouped = series.groupby(["row", "role", "source", "metric"], observed=True, sort=False)["value"]
+        stats = grouped.agg(["count", "mean", "std", "min"])
+        quantiles = grouped.quantile(self.QUANTILES).unstack()
+        quantiles.columns = ["{0:g}%".format(q * 100) for q in self.QUANTILES]
+        stats = stats.join(quantiles)
+        stats["max"] = grouped.max()
+        index = stats.index.to_frame(index=False)
+        prefixes = ("metric_" + index["role"].astype(str) + "_" + index["metric"].astype(str)).tolist()
+        names = [prefix + "_" + stat for prefix in prefixes for stat in stats.columns]
+        summary = pd.DataFrame({
+            "row": np.repeat(index["row"].to_numpy(), len(stats.columns)),
+            "name": names,
+            "value": stats.to_numpy().ravel(),
+        })
+        # same metric name from different sources of a role: the last one wins
+        summary = summary.drop_duplicates(["row", "name"], keep="last")
+        summary = summary.pivot(index="row", columns="name", values="value")
+        return summary.reindex(columns=pd.unique(pd.Series(names)))
+
+    def _save_series(self, series, prefixes):
+        dirname = "./csv"
+        for (row, role, source), group in series.groupby(["row", "role", "source"], observed=True, sort=False):
+            df = group.pivot(index="position", columns="metric", values="value")
+            filename = "_".join([prefixes[row], source, ".csv"])
             filepath = os.path.join(
                 dirname, filename
             )
             df.to_csv(filepath)
             logger.info("Saving series data to %s", filepath)
 
-        return metrics_summary
-
-    def _extract_evals(self, evals, prefix, test, trial, snap_role, save=False):
-        metrics = {
-            "test": test,
-            "trial": trial,
-        }
-        
-        general_metrics = {}
-        for ev in evals:
-            ev_metrics_source = ev.get("source")
-            ev_metrics = ev.get("metrics")
-
-            metrics_summary = {}
-            if type(ev_metrics) is list:
-
-                metrics_summary = { metric.get("name"):metric.get("value")
-                                    for metric in ev_metrics if not metric.get("series") }
-
-                metrics_series = [ metric for metric in ev_metrics if metric.get("series") ]
-                if metrics_series:
-                    metrics_series_summary = self._extract_metrics(metrics_series, prefix, ev_metrics_source, save=save)
-                    metrics_summary.update(metrics_series_summary)
-                            
-            general_metrics.update(metrics_summary)
-
-        metrics_frmt = {"metric_" + snap_role + "_" + k:v for k, v in general_metrics.items()}
-        metrics.update(metrics_frmt)
-
-        return metrics
-
-    def _extract_snaps(self, snaps, report_id, test, save=False):
-        metrics = {} 
-        for snap in snaps:
-            snap_trial = snap.get("trial")
-            snap_origin = snap.get("origin")          
-            snap_role = snap_origin.get("role")          
-            evals = snap.get("evaluations")
-            prefix = "_".join(["report", str(report_id), "test", str(test), "trial", str(snap_trial)])
-            evals_metrics = self._extract_evals(evals, prefix, test, snap_trial, snap_role, save=save)
-            metrics.update(evals_metrics)
-        return metrics
-
-    def _extract_report(self, report, save=False):
-        logger.debug("extracting report")
-        metrics = {}
-        report_id = report.get("id")    
-        report_test = report.get("test")       
-        report_inputs = report.get("inputs")
-        snaps = report.get("snapshots")
-              
-        if report_inputs:
-            inputs_frmt = {"input_" + k: v for k, v in report_inputs.items()}
-        else:
-            inputs_frmt = {}
-
-        metrics = self._extract_snaps(snaps, report_id, report_test, save=save)
-        metrics.update(inputs_frmt)
-        return metrics
+    def _frames(self, save=False):
+        reports = self.vnfpp.get("reports")
+        rows, prefixes, inputs, series = self._collect(reports)
+        df = pd.DataFrame(rows)
+        if series is not None:
+            df = df.join(self._summarize(series))
+            if save:
+                self._save_series(series, prefixes)
+        df = df.join(pd.DataFrame(inputs, index=df.index))
+        return df, series
 
     def extract(self, dataframe=True, save=False):
-        flat_report_metrics = []
+        df = pd.DataFrame()
         if self.vnfpp:
-            reports = self.vnfpp.get("reports")
-
-            flat_report_metrics = []
-            for report in reports:
-                filtered_report_metrics = self._extract_report(report, save=save)
-                flat_report_metrics.append(filtered_report_metrics)
+            df, _ = self._frames(save=save)
+        elif self._dataset:
+            df = self.summary()
         else:
             logger.info("No vnfbr loaded")
 
         if dataframe:
-            df = pd.DataFrame(flat_report_metrics)
             return df
         else:
-            return flat_report_metrics
+            return df.to_dict("records")
+
+    def _series_table(self, df, series):
+        # partition keys as strings, positions as int32, role/metric dictionary encoded
+        rows = series["row"].to_numpy()
+        frame = pd.DataFrame({
+            "test": df["test"].astype(str).to_numpy()[rows],
+            "trial": df["trial"].astype(str).to_numpy()[rows],
+            "source": series["source"].astype(str),
+            "role": series["role"],
+            "metric": series["metric"],
+            "position": series["position"].astype(np.int32),
+            "value": series["value"],
+        })
+        return pa.Table.from_pandas(frame, preserve_index=False)
+
+    def _partitioning(self):
+        schema = pa.schema([(field, pa.string()) for field in VNFBR.PARTITIONS])
+        return pads.partitioning(schema, flavor="hive")
+
+    def _folder(self, folder, name):
+        return os.path.join(folder, name, "vnfbr=" + str(self.id))
+
+    def to_parquet(self, folder):
+        if pa is None:
+            logger.info("pyarrow not available - vnfbr %s not saved to parquet", self.id)
+            return False
+        if not self.vnfpp:
+            logger.info("No vnfbr loaded")
+            return False
+
+        df, series = self._frames()
+        try:
+            summary = pa.Table.from_pandas(df, preserve_index=False)
+            pads.write_dataset(summary, self._folder(folder, "summary"), format="parquet",
+                               existing_data_behavior="delete_matching")
+            if series is not None:
+                pads.write_dataset(self._series_table(df, series), self._folder(folder, "series"),
+                                   format="parquet", partitioning=self._partitioning(),
+                                   existing_data_behavior="delete_matching")
+        except (pa.ArrowException, ValueError, TypeError) as e:
+            logger.info("Could not save vnfbr %s to parquet: %s", self.id, e)
+            return False
+        logger.info("Saving vnfbr parquet data to %s", folder)
+        return True
+
+    def _read(self, name, columns=None, filter=None):
+        folder = self._folder(self._dataset, name)
+        partitioning = self._partitioning() if name == "series" else None
+        dataset = pads.dataset(folder, format="parquet", partitioning=partitioning,
+                               filesystem=LocalFileSystem(use_mmap=True))
+        table = dataset.to_table(columns=columns, filter=filter)
+        return table.to_pandas()
+
+    def summary(self, columns=None):
+        return self._read("summary", columns=columns)
+
+    def series(self, columns=None, **partitions):
+        # e.g., series(columns=["position", "value"], test="0", source="prober_ping")
+        filter = None
+        for field, value in partitions.items():
+            expression = pads.field(field) == str(value)
+            filter = expression if filter is None else filter & expression
+        return self._read("series", columns=columns, filter=filter)
 
     def compile(self):
         df = self.extract(save=True)
@@ -141,6 +239,13 @@ class VNFBR(Content):
         return data
 
     def load(self, filepath):
+        if os.path.isdir(filepath):
+            if pa is None:
+                logger.info("pyarrow not available - could not load vnfbr dataset %s", filepath)
+            else:
+                self._dataset = filepath
+            return
+
         vnfbr = self._load_file(filepath)
         if vnfbr:
             self.vnfpp = vnfbr.get("result").get("vnfpp")
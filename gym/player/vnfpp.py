@@ -2,6 +2,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 import os
+import json
 from functools import reduce
 
 import numpy as np
@@ -13,14 +14,13 @@ from gym.common.info import Content
 
 
 class VNFPP(Content):
-    def __init__(self):
+    def __init__(self, log=None):
         Content.__init__(self)
         self.id = None
         self.reports = []
         self._inputs_list = {}
         self._instance = None
-        self._reports = {}
-        self._vnfbd_instances_inputs = {}
+        self._log = log
         
     def set_id(self, instance_id):
         self.id = instance_id
@@ -29,9 +29,29 @@ class VNFPP(Content):
         return self.id
 
     def add_report(self, vnfbd, report):
-        report_id = report.get_id()
-        self._reports[report_id] = report
-        self._vnfbd_instances_inputs[report_id] = vnfbd.get_inputs()
+        # compiled right away, so the raw report message is not kept around
+        profile = self._process_report(report, vnfbd.get_inputs())
+        self.reports.append(profile)
+        if self._log:
+            self._append(profile)
+
+    def _append(self, profile):
+        try:
+            with open(self._log, 'a') as f:
+                f.write(json.dumps(profile, default=lambda o: o.__dict__, sort_keys=True))
+                f.write('\n')
+        except OSError as e:
+            logger.info("Could not append report to vnf-pp log %s: %s", self._log, e)
+
+    def load_log(self, filepath=None):
+        # reports compiled so far, e.g., while the vnf-bd is still running
+        filepath = filepath if filepath else self._log
+        reports = []
+        with open(filepath, 'r') as f:
+            for line in f:
+                if line.strip():
+                    reports.append(json.loads(line))
+        return reports
 
     def _retrieve_dict(self, content, keywords):
         _dict = {}
@@ -65,19 +85,18 @@ class VNFPP(Content):
         logger.debug("report filtered_inputs %s", filtered_inputs)
         return filtered_inputs
 
+    def _process_report(self, report, vnfbd_inputs):
+        keywords = ['id', 'test', 'timestamp']
+        snapshots = report.get('snapshots')
+        snaps = list(map(self._process_snapshot, snapshots))
+        profile = self._retrieve_dict(report, keywords)
+        profile['snapshots'] = snaps
+        profile['inputs'] = self._filter_vnfbd_inputs(vnfbd_inputs)
+        return profile
+
     def compile(self, layout_id=None):
-        logger.info("compile vnf-pp")
+        logger.info("compile vnf-pp - reports %s", len(self.reports))
         self._instance = layout_id
-        for report_id,report in self._reports.items(): 
-            snapshots = report.get('snapshots')
-            snaps = list(map(self._process_snapshot, snapshots))
-            keywords = ['id', 'test', 'timestamp']
-            profile = self._retrieve_dict(report, keywords)
-            profile['snapshots'] = snaps
-            vnfbd_inputs = self._vnfbd_instances_inputs.get(report_id)
-            profile_inputs = self._filter_vnfbd_inputs(vnfbd_inputs)
-            profile['inputs'] = profile_inputs
-            self.reports.append(profile)
 
     def has_list_value(self, dict_items):
         fields_list = [ field for field,value in dict_items.items() if type(value) is list ]
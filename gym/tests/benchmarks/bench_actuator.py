@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import argparse
+
+from gym.agent.agent import Agent
+from gym.common.process import Actuator
+from gym.common.messages import Action, Instruction
+from gym.common.defs.tools import PROBER_PING
+
+
+def actuator(execution):
+    folder = os.path.join(
+        os.path.dirname(os.path.abspath(sys.modules[Agent.__module__].__file__)),
+        Agent.FILES)
+
+    cfg = {
+        "folder": folder,
+        "prefix": Agent.FILES_PREFIX,
+        "full_path": True,
+        "class_prefix": Agent.CLASS_PREFIX,
+        "execution": execution,
+    }
+    act = Actuator()
+    act.cfg(cfg)
+    return act
+
+
+def instruction(actions, target):
+    inst = Instruction()
+    for _ in range(actions):
+        action = Action()
+        action.set('stimulus', {
+            "id": PROBER_PING,
+            "parameters": {
+                "target": target,
+                "packets": 1,
+                "interval": 0.2,
+            },
+        })
+        inst.add_action(action)
+    return inst
+
+
+def main(rounds, actions, target):
+    print("%-8s %8s %14s %14s" % ("mode", "actions", "total (s)", "per act (ms)"))
+    for execution in ["process", "pool"]:
+        act = actuator(execution)
+        inst = instruction(actions, target)
+        act.act(inst)
+        took = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            evals = act.act(inst)
+            took.append(time.perf_counter() - start)
+        best = min(took)
+        print("%-8s %8s %14.4f %14.2f" % (execution, len(evals), best, 1000.0 * best / len(evals)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym actuator per-action overhead benchmark')
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--actions', type=int, default=1)
+    parser.add_argument('--target', type=str, default="127.0.0.1")
+    args = parser.parse_args()
+    main(args.rounds, args.actions, args.target)
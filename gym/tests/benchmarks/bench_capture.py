@@ -0,0 +1,77 @@
+import sys
+import time
+import json
+import resource
+import argparse
+import subprocess
+
+from gym.agent.probers.prober import Processor
+
+
+LINE = "64 bytes from 127.0.0.1: icmp_seq=%d ttl=64 time=0.045 ms"
+
+WRITER = '''
+import sys
+line = %r
+out = sys.stdout
+total = 0
+seq = 0
+while total < %d:
+    text = line %% seq + "\\n"
+    out.write(text)
+    total += len(text)
+    seq += 1
+'''
+
+
+def writer(megabytes):
+    return [sys.executable, "-c", WRITER % (LINE, megabytes * 1024 * 1024)]
+
+
+def run_communicate(megabytes):
+    p = subprocess.Popen(writer(megabytes), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = p.communicate()
+    lines = out.decode('UTF-8').split('\n')
+    return len(lines) - 1
+
+
+def run_capture(megabytes, ring):
+    counter = [0]
+
+    def feed(line):
+        counter[0] += 1
+
+    ret, out, err = Processor().start_process(writer(megabytes), consumer=feed, size=ring)
+    return counter[0]
+
+
+def child(mode, megabytes, ring):
+    start = time.perf_counter()
+    if mode == "communicate":
+        lines = run_communicate(megabytes)
+    else:
+        lines = run_capture(megabytes, ring)
+    took = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"lines": lines, "took": took, "rss": rss}))
+
+
+def main(megabytes, ring):
+    print("%-12s %10s %10s %14s" % ("mode", "lines", "time (s)", "peak rss (MB)"))
+    for mode in ["communicate", "capture"]:
+        out = subprocess.check_output([sys.executable, __file__, "--child", mode,
+                                       "--megabytes", str(megabytes), "--ring", str(ring)])
+        res = json.loads(out.decode('UTF-8'))
+        print("%-12s %10s %10.2f %14.1f" % (mode, res["lines"], res["took"], res["rss"] / 1024.0))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym prober output capture benchmark')
+    parser.add_argument('--megabytes', type=int, default=100)
+    parser.add_argument('--ring', type=int, default=1024 * 1024)
+    parser.add_argument('--child', type=str, default=None)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.megabytes, args.ring)
+    else:
+        main(args.megabytes, args.ring)
@@ -0,0 +1,84 @@
+import time
+import json
+import random
+import asyncio
+import argparse
+
+from aiohttp import web
+
+from gym.common.es.bulk import Bulk
+
+
+class FakeES:
+    # answers _bulk like elasticsearch, rejecting some documents with 429
+    def __init__(self, reject):
+        self.reject = reject
+        self.requests = 0
+        self.documents = {}
+
+    async def bulk(self, request):
+        self.requests += 1
+        lines = (await request.read()).decode('utf-8').splitlines()
+        items = []
+        for action, source in zip(lines[0::2], lines[1::2]):
+            doc_id = json.loads(action)["index"]["_id"]
+            if random.random() < self.reject:
+                items.append({"index": {"_id": doc_id, "status": 429}})
+            else:
+                self.documents[doc_id] = json.loads(source)
+                items.append({"index": {"_id": doc_id, "status": 201}})
+        errors = any(item["index"]["status"] != 201 for item in items)
+        return web.json_response({"took": 1, "errors": errors, "items": items})
+
+
+class VNFBR(dict):
+    pass
+
+
+def vnfbr(tests, evals, length):
+    reports = []
+    for test in range(tests):
+        snapshots = [{
+            "id": role, "trial": 0, "origin": {"role": role, "id": role},
+            "evaluations": [{
+                "id": ev, "source": {"type": "prober", "name": "ping"}, "timestamp": {},
+                "metrics": [{"name": "loss", "value": 0.0},
+                            {"name": "rtt", "series": True, "value": [random.random() for _ in range(length)]}],
+            } for ev in range(evals)],
+        } for role in ["agent", "monitor"]]
+        reports.append({"id": test, "test": test, "inputs": {}, "snapshots": snapshots})
+    return VNFBR(id="bench", vnfpp={"reports": reports})
+
+
+async def run(tests, evals, length, batch, reject):
+    fake = FakeES(reject)
+    app = web.Application()
+    app.add_routes([web.post('/_bulk', fake.bulk)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+
+    bulk = Bulk(url='127.0.0.1:%s' % port, batch=batch, backoff=0.01, retries=8)
+    data = vnfbr(tests, evals, length)
+    start = time.perf_counter()
+    ack = await bulk.store(data)
+    took = time.perf_counter() - start
+    await bulk.close()
+    await runner.cleanup()
+
+    expected = tests * evals * 2
+    print("%8s %8s %8s %10s %14s %6s" % ("docs", "indexed", "requests", "time (s)", "docs/s", "ack"))
+    print("%8s %8s %8s %10.3f %14.1f %6s" % (expected, len(fake.documents), fake.requests, took, expected / took, ack))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym elasticsearch bulk storage benchmark')
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--evals', type=int, default=5)
+    parser.add_argument('--length', type=int, default=60)
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--reject', type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args.tests, args.evals, args.length, args.batch, args.reject))
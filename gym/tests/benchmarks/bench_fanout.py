@@ -0,0 +1,90 @@
+import time
+import asyncio
+import logging
+import argparse
+
+from aiohttp import web
+
+from gym.common.asyncs.app import App
+from gym.common.messages import Instruction
+
+
+logging.basicConfig(level=logging.ERROR)
+
+
+class Peers:
+    # local stand-in peers, each one on its own port, acking every post
+    def __init__(self, count, port):
+        self.count = count
+        self.port = port
+        self.received = 0
+        self.done = None
+        self.runner = None
+
+    async def handle(self, request):
+        await request.read()
+        self.received += 1
+        if self.received >= self.expected and not self.done.done():
+            self.done.set_result(time.perf_counter())
+        return web.HTTPOk(text="Ack")
+
+    async def start(self):
+        app = web.Application()
+        app.add_routes([web.post('/{identifier}', self.handle)])
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        for index in range(self.count):
+            site = web.TCPSite(self.runner, '127.0.0.1', self.port + index)
+            await site.start()
+
+    def expect(self, expected):
+        self.received = 0
+        self.expected = expected
+        self.done = asyncio.get_running_loop().create_future()
+        return self.done
+
+    def urls(self):
+        return ["http://127.0.0.1:%s/%s" % (self.port + index, index) for index in range(self.count)]
+
+
+async def run(count, port, rounds):
+    peers = Peers(count, port)
+    await peers.start()
+
+    app = App()
+    dispatch = asyncio.get_running_loop().create_task(app._output_loop())
+
+    samples = []
+    for _ in range(rounds):
+        outputs = []
+        for url in peers.urls():
+            instruction = Instruction()
+            instruction.to(url)
+            outputs.append(instruction)
+        done = peers.expect(len(outputs))
+        start = time.perf_counter()
+        app.out_queue.put_nowait(outputs)
+        samples.append(await done - start)
+
+    dispatch.cancel()
+    try:
+        await dispatch
+    except asyncio.CancelledError:
+        pass
+    if hasattr(app, "close"):
+        await app.close()
+    await peers.runner.cleanup()
+
+    samples.sort()
+    print("%8s %8s %10s %10s %10s" % ("peers", "rounds", "mean (ms)", "p50 (ms)", "max (ms)"))
+    print("%8s %8s %10.2f %10.2f %10.2f" % (
+        count, rounds, 1000 * sum(samples) / rounds, 1000 * samples[rounds // 2], 1000 * samples[-1]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym output fan-out benchmark')
+    parser.add_argument('--peers', type=int, default=100)
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.peers, args.port, args.rounds))
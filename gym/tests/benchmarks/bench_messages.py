@@ -0,0 +1,66 @@
+import time
+import random
+import argparse
+
+from gym.common import wire
+from gym.common.messages import Message, Report, Snapshot, Evaluation, rpc_map
+
+
+def report(snapshots, evaluations, length):
+    snaps = []
+    for snap_id in range(snapshots):
+        evals = []
+        for eval_id in range(evaluations):
+            evaluation = Evaluation(id=eval_id)
+            evaluation.set("source", {"id": eval_id, "type": "prober", "name": "ping"})
+            evaluation.set("timestamp", {"start": time.time(), "stop": time.time()})
+            evaluation.set("metrics", [
+                {"name": "rtt_avg", "unit": "ms", "type": "float", "value": random.random()},
+                {"name": "rtt", "unit": "ms", "type": "float", "series": True,
+                 "value": [random.random() for _ in range(length)]},
+            ])
+            evals.append(evaluation)
+        snapshot = Snapshot(id=snap_id)
+        snapshot.set("origin", {"id": snap_id, "role": "agent", "host": "localhost"})
+        snapshot.set("evaluations", evals)
+        snaps.append(snapshot)
+    msg = Report(id=1)
+    msg.set("test", 1)
+    msg.set("snapshots", snaps)
+    return msg
+
+
+def measure(call, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        output = call()
+    return time.perf_counter() - start, output
+
+
+def main(snapshots, evaluations, length, count):
+    msg = report(snapshots, evaluations, length)
+    took_encode, data = measure(msg.to_json, count)
+    took_decode, parsed = measure(lambda: Message.parse(data, rpc_map), count)
+    encoded = parsed.to_json()
+    assert Message.parse(encoded, rpc_map).to_json() == encoded
+
+    print("%-8s %10s %10s %10s %12s" % ("step", "bytes", "count", "time (s)", "reports/s"))
+    print("%-8s %10s %10s %10.3f %12.1f" % ("encode", len(data), count, took_encode, count / took_encode))
+    print("%-8s %10s %10s %10.3f %12.1f" % ("decode", len(data), count, took_decode, count / took_decode))
+
+    if wire.available():
+        took_pack, packed = measure(lambda: wire.pack(msg), count)
+        took_unpack, unpacked = measure(lambda: Message.parse_dict(wire.unpack(packed), rpc_map), count)
+        assert unpacked.to_json() == parsed.to_json()
+        print("%-8s %10s %10s %10.3f %12.1f" % ("pack", len(packed), count, took_pack, count / took_pack))
+        print("%-8s %10s %10s %10.3f %12.1f" % ("unpack", len(packed), count, took_unpack, count / took_unpack))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym message encode/decode benchmark')
+    parser.add_argument('--snapshots', type=int, default=10)
+    parser.add_argument('--evaluations', type=int, default=5)
+    parser.add_argument('--length', type=int, default=60)
+    parser.add_argument('--count', type=int, default=200)
+    args = parser.parse_args()
+    main(args.snapshots, args.evaluations, args.length, args.count)
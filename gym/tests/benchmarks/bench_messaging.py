@@ -0,0 +1,181 @@
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import subprocess
+
+from aiohttp import web
+
+from gym.common.entity import Component
+from gym.common.asyncs.app import App
+from gym.common.messages import Task, Instruction, Snapshot, Report
+
+
+logging.basicConfig(level=logging.ERROR)
+
+
+class Origin(Component):
+    # greets the relay (and through it the leaf), then sends tasks to it
+    def __init__(self, info, in_q, out_q):
+        Component.__init__(self, "origin", in_q, out_q, info)
+        self.waiting = {}
+        self.peer = None
+
+    async def sched_greetings(self):
+        pass
+
+    def _wait(self, key):
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[key] = future
+        return future
+
+    def update_info(self, peer=None):
+        self.peer = peer
+        future = self.waiting.pop("info", None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def hello(self, contacts):
+        future = self._wait("info")
+        self.send_event_greetings(contacts)
+        return await future
+
+    def send_event_greetings(self, contacts):
+        self.greetings({"contacts": contacts})
+
+    async def task(self, task_id):
+        future = self._wait(task_id)
+        task = Task(id=task_id)
+        task.to(self.peer.get_address(), prefix=self.peer.get_prefix())
+        self.exit([task])
+        return await future
+
+    def _handle(self, msg):
+        if msg.get_type() == "report":
+            future = self.waiting.pop(msg.get_id(), None)
+            if future and not future.done():
+                future.set_result(time.perf_counter())
+
+
+class Relay(Component):
+    # forwards each task as an instruction to its peers and reports back their snapshots
+    def __init__(self, info, in_q, out_q):
+        Component.__init__(self, "relay", in_q, out_q, info)
+
+    def _handle(self, msg):
+        what = msg.get_type()
+        if what == "task":
+            outputs = []
+            for peer in self.peers.get_by("role", "leaf", all=True):
+                instruction = Instruction()
+                instruction.to(peer.get_address(), prefix=peer.get_prefix())
+                outputs.append(instruction)
+            self.sched_mapping(msg, outputs)
+            self.exit(outputs)
+        elif what == "snapshot":
+            if self.ack_reply(msg) and self.check_all_acks(msg):
+                input_id = self.get_input_id(msg)
+                task = self.get_input(input_id)
+                report = Report(id=task.get_id())
+                self.stamp_output(task, report)
+                self.clear_mapping(input_id)
+                self.exit([report])
+
+
+class Leaf(Component):
+    def __init__(self, info, in_q, out_q):
+        Component.__init__(self, "leaf", in_q, out_q, info)
+
+    def _handle(self, msg):
+        if msg.get_type() == "instruction":
+            snapshot = Snapshot(id=msg.get_id())
+            self.stamp_output(msg, snapshot)
+            self.exit([snapshot])
+
+
+class BenchApp(App):
+    def set_routes(self):
+        self.route("POST", "/{identifier}", self.handle)
+
+    async def serve(self, component, info):
+        self.binary = bool(info.get("binary"))
+        self.handler = component(info, self.in_queue, self.out_queue)
+        self.config_app()
+        self.set_routes()
+        self.config_routes(self.routes)
+        self._register_event_callers(self.handler)
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", info.get("port"))
+        await site.start()
+        return runner
+
+
+def url(port):
+    return "http://127.0.0.1:%s" % port
+
+
+async def child(role, port, binary):
+    component = Relay if role == "relay" else Leaf
+    app = BenchApp()
+    await app.serve(component, {"id": role, "url": url(port), "port": port, "binary": role in binary})
+    await asyncio.Event().wait()
+
+
+def summary(name, samples):
+    samples = sorted(samples)
+    count = len(samples)
+    print("%-12s %6s %10.2f %10.2f %10.2f %10.2f" % (
+        name, count, 1000 * sum(samples) / count, 1000 * samples[count // 2],
+        1000 * samples[int(count * 0.99)], 1000 * samples[-1]))
+
+
+async def origin(port, count, binary):
+    app = BenchApp()
+    runner = await app.serve(Origin, {"id": "origin", "url": url(port), "port": port, "binary": "origin" in binary})
+    component = app.handler
+    contacts = [{"address": url(port + 1), "contacts": [url(port + 2)]}]
+
+    hellos = []
+    for _ in range(count):
+        start = time.perf_counter()
+        hellos.append(await component.hello(contacts) - start)
+
+    tasks = []
+    for task_id in range(count):
+        start = time.perf_counter()
+        tasks.append(await component.task(str(task_id + 1)) - start)
+
+    print("%-12s %6s %10s %10s %10s %10s" % ("round trip", "count", "mean (ms)", "p50 (ms)", "p99 (ms)", "max (ms)"))
+    summary("hello/info", hellos)
+    summary("task/report", tasks)
+    await runner.cleanup()
+
+
+def main(port, count, binary):
+    children = [
+        subprocess.Popen([sys.executable, __file__, "--role", "relay", "--port", str(port + 1), "--binary", binary]),
+        subprocess.Popen([sys.executable, __file__, "--role", "leaf", "--port", str(port + 2), "--binary", binary]),
+    ]
+    try:
+        time.sleep(2)
+        asyncio.run(origin(port, count, binary.split(",")))
+    finally:
+        for process in children:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym messaging latency benchmark (three local processes)')
+    parser.add_argument('--role', type=str, default="origin")
+    parser.add_argument('--port', type=int, default=8970)
+    parser.add_argument('--count', type=int, default=50)
+    parser.add_argument('--binary', type=str, default="",
+                        help='Comma separated roles using msgpack with peers that accept it, e.g. origin,relay')
+    args = parser.parse_args()
+    if args.role == "origin":
+        main(args.port, args.count, args.binary)
+    else:
+        asyncio.run(child(args.role, args.port, args.binary.split(",")))
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import json
+import argparse
+import tempfile
+import subprocess
+
+from gym.agent.agent import Agent
+from gym.monitor.monitor import Monitor
+
+
+COMPONENTS = {
+    "agent": Agent,
+    "monitor": Monitor,
+}
+
+
+def component_cfg(component, mode, cache):
+    cls = COMPONENTS[component]
+    folder = os.path.join(
+        os.path.dirname(os.path.abspath(sys.modules[cls.__module__].__file__)),
+        cls.FILES)
+
+    cfg = {
+        "folder": folder,
+        "prefix": cls.FILES_PREFIX,
+        "full_path": True,
+    }
+    if mode != "spawn":
+        cfg["class_prefix"] = cls.CLASS_PREFIX
+        cfg["cache"] = cache
+    return cfg
+
+
+def boot(component, mode, cache):
+    from gym.common.process import Actuator
+    actuator = Actuator()
+    cfg = component_cfg(component, mode, cache)
+    start = time.perf_counter()
+    actuator.cfg(cfg)
+    took = time.perf_counter() - start
+    print(json.dumps({"took": took, "acts": len(actuator.get_acts())}))
+
+
+def measure(component, mode, cache):
+    args = [sys.executable, os.path.abspath(__file__),
+            "--boot", component, "--mode", mode, "--cache", cache]
+    start = time.perf_counter()
+    out = subprocess.check_output(args)
+    total = time.perf_counter() - start
+    result = json.loads(out.decode("utf-8").strip().split("\n")[-1])
+    result["total"] = total
+    return result
+
+
+def main(rounds):
+    cache_dir = tempfile.mkdtemp(prefix="gym-bench-")
+    print("%-8s %-6s %12s %12s %6s" % ("comp", "mode", "load (s)", "process (s)", "acts"))
+    for component in COMPONENTS:
+        cache = os.path.join(cache_dir, component + ".json")
+        for mode in ["spawn", "cold", "warm"]:
+            loads, totals = [], []
+            for _ in range(rounds):
+                if mode == "cold" and os.path.exists(cache):
+                    os.remove(cache)
+                result = measure(component, mode, cache)
+                loads.append(result["took"])
+                totals.append(result["total"])
+            print("%-8s %-6s %12.4f %12.4f %6s" % (
+                component, mode, min(loads), min(totals), result["acts"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym startup benchmark')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--boot', type=str, default=None)
+    parser.add_argument('--mode', type=str, default="warm")
+    parser.add_argument('--cache', type=str, default=None)
+    args = parser.parse_args()
+
+    if args.boot:
+        boot(args.boot, args.mode, args.cache)
+    else:
+        main(args.rounds)
@@ -0,0 +1,96 @@
+import time
+import asyncio
+import logging
+import argparse
+import tracemalloc
+
+from aiohttp import web
+
+from gym.common import wire
+from gym.common.asyncs.app import App
+from gym.common.messages import Instruction
+from gym.tests.benchmarks.bench_messages import report
+
+
+logging.basicConfig(level=logging.ERROR)
+
+
+class Receiver(App):
+    def set_routes(self):
+        self.route("POST", "/{identifier}", self.handle)
+
+    async def serve(self, port, binary):
+        self.binary = binary
+        self.set_routes()
+        self.config_routes(self.routes)
+        runner = web.AppRunner(self.app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        return runner
+
+
+async def wire_size(sender, url, data):
+    body, _ = sender._body(url, data)
+    if body is data:
+        return len(data)
+    size = 0
+    async for block in body:
+        size += len(block)
+    return size
+
+
+async def run(port, count, msg, binary, compress):
+    receiver = Receiver()
+    runner = await receiver.serve(port, binary)
+    url = "http://127.0.0.1:%s/1" % port
+
+    sender = App()
+    sender.binary = binary
+    sender.compress = compress
+    # a first small message learns what the receiver accepts
+    await sender.send(url, Instruction().to_json())
+    receiver.in_queue.get_nowait()
+
+    data, content_type = sender._encode(msg, url)
+    size = await wire_size(sender, url, data)
+
+    start = time.perf_counter()
+    for _ in range(count):
+        await sender.send(url, data, content_type)
+        receiver.in_queue.get_nowait()
+    took = time.perf_counter() - start
+
+    # allocations on top of the encoded body, for one send and receive
+    tracemalloc.start()
+    await sender.send(url, data, content_type)
+    receiver.in_queue.get_nowait()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await sender.close()
+    await runner.cleanup()
+    return len(data), size, took, peak
+
+
+async def main(port, count, snapshots, evaluations, length):
+    msg = report(snapshots, evaluations, length)
+    modes = [("json", False, False), ("json+gzip", False, True)]
+    if wire.available():
+        modes += [("msgpack", True, False), ("msgpack+gzip", True, True)]
+
+    print("%-14s %12s %12s %10s %12s %14s" % ("format", "body bytes", "wire bytes", "count", "time (s)", "peak mem (MB)"))
+    for name, binary, compress in modes:
+        body, size, took, peak = await run(port, count, msg, binary, compress)
+        print("%-14s %12s %12s %10s %12.3f %14.1f" % (name, body, size, count, took, peak / 1024 ** 2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym large message transfer benchmark')
+    parser.add_argument('--port', type=int, default=9300)
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--snapshots', type=int, default=10)
+    parser.add_argument('--evaluations', type=int, default=5)
+    parser.add_argument('--length', type=int, default=3600)
+    args = parser.parse_args()
+    asyncio.run(main(args.port, args.count, args.snapshots, args.evaluations, args.length))
@@ -0,0 +1,51 @@
+import os
+import json
+import time
+import argparse
+
+from gym.player import vnfbd as vnfbd_module
+from gym.player.vnfbd import VNFBD
+
+
+LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layouts", "layout-004.json")
+
+
+def inputs(layout):
+    with open(layout, 'r') as f:
+        data = json.load(f)
+    return data["params"]["vnf_bd"]["inputs"]
+
+
+def instantiate(filename, layout_inputs, count, mode):
+    VNFBD.PATCHING = mode == "patched"
+    vnfbd = VNFBD()
+    vnfbd.load(filename, inputs=layout_inputs)
+    vnfbd.multiplex_parameters(layout_inputs)
+    total = vnfbd._mux_total
+
+    start = time.perf_counter()
+    for index in range(count):
+        if mode == "cleared":
+            vnfbd_module.templates.clear()
+        input_id = 500 + index % total
+        instance_inputs = vnfbd.mux_input(input_id)
+        instance_inputs["id"] = input_id
+        vnfbd.instance(instance_inputs)
+    return time.perf_counter() - start
+
+
+def main(filename, count):
+    layout_inputs = inputs(LAYOUT)
+    print("%-8s %8s %10s %14s" % ("mode", "inputs", "time (s)", "inputs/s"))
+    for mode in ["cleared", "cached", "patched"]:
+        vnfbd_module.templates.clear()
+        took = instantiate(filename, layout_inputs, count, mode)
+        print("%-8s %8s %10.3f %14.1f" % (mode, count, took, count / took))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym VNF-BD instantiation benchmark')
+    parser.add_argument('--filename', type=str, default="vnf-bd-004.yaml")
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args()
+    main(args.filename, args.count)
@@ -0,0 +1,51 @@
+import time
+import random
+import argparse
+
+from gym.player.vnfbr import VNFBR
+
+
+def evaluation(source, length):
+    return {
+        "source": {"type": "prober", "name": source},
+        "metrics": [
+            {"name": "loss", "value": random.random()},
+            {"name": "rtt", "series": True, "value": [random.random() for _ in range(length)]},
+            {"name": "bps", "series": True, "value": [random.random() for _ in range(length)]},
+        ],
+    }
+
+
+def vnfpp(tests, trials, length):
+    reports = []
+    for test in range(tests):
+        snapshots = []
+        for trial in range(trials):
+            for role, source in [("agent", "ping"), ("monitor", "host")]:
+                snapshots.append({
+                    "trial": trial,
+                    "origin": {"role": role},
+                    "evaluations": [evaluation(source, length)],
+                })
+        reports.append({"id": test, "test": test, "inputs": {"rate": test}, "snapshots": snapshots})
+    return {"reports": reports}
+
+
+def main(tests, trials, length):
+    vnfbr = VNFBR("bench")
+    vnfbr.vnfpp = vnfpp(tests, trials, length)
+    start = time.perf_counter()
+    df = vnfbr.extract()
+    took = time.perf_counter() - start
+    points = tests * trials * 2 * 2 * length
+    print("%8s %8s %8s %10s %14s" % ("tests", "trials", "rows", "time (s)", "points/s"))
+    print("%8s %8s %8s %10.3f %14.1f" % (tests, trials, len(df), took, points / took))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Gym VNF-BR extraction benchmark')
+    parser.add_argument('--tests', type=int, default=200)
+    parser.add_argument('--trials', type=int, default=3)
+    parser.add_argument('--length', type=int, default=3600)
+    args = parser.parse_args()
+    main(args.tests, args.trials, args.length)
@@ -0,0 +1,151 @@
+import os
+import socket
+import asyncio
+
+import pytest
+
+from gym.agent.agent import Agent
+from gym.common.process import AsyncActuator
+from gym.common.messages import Instruction, Action, Release
+
+
+proc_net = pytest.mark.skipif(not os.path.exists('/proc/net/udp'), reason="needs /proc/net")
+
+
+@proc_net
+def test_listening_udp_server():
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    try:
+        agent = Agent.__new__(Agent)
+        assert port in agent.listening_ports()
+        assert asyncio.run(agent.wait_listening([port]))
+    finally:
+        server.close()
+
+
+@proc_net
+def test_listening_tcp_server():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    agent = Agent.__new__(Agent)
+    try:
+        assert port not in agent.listening_ports()
+        server.listen()
+        assert port in agent.listening_ports()
+    finally:
+        server.close()
+
+
+def test_spawned_tasks_are_kept_and_logged(caplog):
+    async def run():
+        agent = Agent.__new__(Agent)
+        agent._tasks = set()
+        done = asyncio.Event()
+
+        async def fail():
+            await done.wait()
+            raise ValueError("execution failed")
+
+        task = agent.spawn(fail())
+        assert task in agent._tasks
+        done.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert task not in agent._tasks
+
+    asyncio.run(run())
+    assert "execution failed" in caplog.text
+
+
+def barrier_agent():
+    agent = Agent.__new__(Agent)
+    agent._releases = {}
+    agent.out_q = asyncio.Queue()
+    agent.stamp_output = lambda input, output: None
+    return agent
+
+
+def test_barrier_waits_for_release():
+    async def run():
+        agent = barrier_agent()
+        inst = Instruction()
+        inst.set_id("7:0:a1")
+        inst.set_prefix("200")
+        waiting = asyncio.ensure_future(agent.barrier(inst, []))
+
+        ready = (await agent.out_q.get())[0]
+        assert ready.get_type() == "ready"
+        assert (ready.get_prefix(), ready.get_id()) == ("200", "7:0:a1")
+
+        # a release of another trial does not open this barrier
+        for prefix, release_id in [("200", "7:1:a1"), ("201", "7:0:a1")]:
+            release = Release(id=release_id)
+            release.set_prefix(prefix)
+            agent.release(release)
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+
+        release = Release(id="7:0:a1")
+        release.set_prefix("200")
+        agent.release(release)
+        await asyncio.wait_for(waiting, 1)
+        assert agent._releases == {}
+
+    asyncio.run(run())
+
+
+def test_barrier_starts_without_release(monkeypatch):
+    monkeypatch.setattr(Agent, "RELEASE_TIMEOUT", 0.05)
+
+    async def run():
+        agent = barrier_agent()
+        inst = Instruction()
+        inst.set_id("7:0:a1")
+        await asyncio.wait_for(agent.barrier(inst, []), 1)
+        assert agent.out_q.qsize() == 1
+        assert agent._releases == {}
+
+    asyncio.run(run())
+
+
+def test_failed_execution_still_replies():
+    async def run():
+        agent = barrier_agent()
+        agent.actuator = AsyncActuator()
+        agent.origin = lambda: {}
+
+        async def act(msg, barrier=None):
+            raise RuntimeError("no probers")
+
+        agent.actuator.act = act
+        inst = Instruction()
+        inst.set_id("7:0:a1")
+        action = Action()
+        action.set("stimulus", {"id": 1, "parameters": {}})
+        inst.add_action(action)
+        await agent.execute(inst)
+
+        snap = (await agent.out_q.get())[0]
+        assert snap.get_type() == "snapshot" and snap.get_id() == "7:0:a1"
+        evaluation = snap.get("evaluations")[0]
+        assert "no probers" in evaluation.get("error").get("data")
+
+    asyncio.run(run())
+
+
+def test_execution_settings_from_cfg():
+    agent = Agent.__new__(Agent)
+    agent.actuator = AsyncActuator()
+    cfgs = []
+    agent.actuator.cfg = cfgs.append
+
+    agent.cfg_acts({"id": "1", "url": "http://127.0.0.1:1"})
+    assert cfgs[-1]["execution"] == Agent.EXECUTION
+    assert "deadline" not in cfgs[-1]
+
+    agent.cfg_acts({"execution": "process", "workers": 4, "deadline": 600})
+    assert cfgs[-1]["execution"] == "process"
+    assert cfgs[-1]["workers"] == 4 and cfgs[-1]["deadline"] == 600
@@ -0,0 +1,139 @@
+import socket
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from gym.common import info
+from gym.common import wire
+from gym.common.asyncs.app import App
+from gym.common.messages import Message, Evaluation, Snapshot, rpc_map
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def serve(handle):
+    app = web.Application()
+    app.add_routes([web.post('/{identifier}', handle)])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    port = free_port()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner, "http://127.0.0.1:%s/1" % port
+
+
+def test_slow_peer_is_not_posted_twice(monkeypatch):
+    monkeypatch.setattr(App, "TIMEOUT", 0.2)
+    monkeypatch.setattr(App, "BACKOFF", 0)
+    posts = []
+
+    async def handle(request):
+        posts.append(await request.read())
+        await asyncio.sleep(1)
+        return web.HTTPOk(text="Ack")
+
+    async def run():
+        runner, url = await serve(handle)
+        app = App()
+        try:
+            assert await app.send(url, '{}') is None
+        finally:
+            await app.close()
+            await runner.cleanup()
+
+    asyncio.run(run())
+    assert len(posts) == 1
+
+
+def test_unreachable_peer_is_retried(monkeypatch):
+    monkeypatch.setattr(App, "BACKOFF", 0)
+    attempts = []
+
+    async def run():
+        app = App()
+        url = "http://127.0.0.1:%s/1" % free_port()
+        session = app.session()
+        post = session.post
+
+        def counted(*args, **kwargs):
+            attempts.append(args)
+            return post(*args, **kwargs)
+
+        monkeypatch.setattr(session, "post", counted)
+        try:
+            assert await app.send(url, '{}') is None
+        finally:
+            await app.close()
+
+    asyncio.run(run())
+    assert len(attempts) == App.RETRIES + 1
+
+
+def large_snapshot():
+    ev = Evaluation(id=1)
+    ev.set("metrics", [{"name": "rtt", "series": True, "value": [i / 7.0 for i in range(50000)]}])
+    snap = Snapshot(id=2)
+    snap.set("evaluations", [ev])
+    return snap
+
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_large_body_compressed_round_trip(binary):
+    if binary and not wire.available():
+        pytest.skip("msgpack not available")
+    received = []
+
+    async def run():
+        receiver = App()
+        receiver.binary = binary
+
+        async def handle(request):
+            received.append(request.headers)
+            return await receiver.handle(request)
+
+        runner, url = await serve(handle)
+        sender = App()
+        sender.binary = binary
+        sender.compress = True
+        try:
+            # the first ack tells the sender what the receiver accepts
+            hello = Snapshot(id=1)
+            assert await sender.send(url, *sender._encode(hello, url)) == "Ack"
+            snap = large_snapshot()
+            data, content_type = sender._encode(snap, url)
+            assert len(data) >= App.COMPRESS
+            assert await sender.send(url, data, content_type) == "Ack"
+        finally:
+            await sender.close()
+            await runner.cleanup()
+
+        msgs = [receiver.in_queue.get_nowait().msg for _ in range(2)]
+        assert info.dumps(msgs[1]) == info.dumps(Message.parse(snap.to_json(), rpc_map))
+
+    asyncio.run(run())
+    assert "Content-Encoding" not in received[0]
+    assert received[1]["Content-Encoding"] == wire.GZIP
+    assert received[1]["Content-Type"] == (wire.MSGPACK if binary else wire.JSON)
+
+
+def test_body_over_max_size_is_rejected(monkeypatch):
+    monkeypatch.setattr(App, "MAX_SIZE", App.CHUNK)
+
+    async def run():
+        receiver = App()
+        runner, url = await serve(receiver.handle)
+        sender = App()
+        try:
+            data = large_snapshot().to_json()
+            async with sender.session().post(url, data=data) as response:
+                assert response.status == 413
+        finally:
+            await sender.close()
+            await runner.cleanup()
+        assert receiver.in_queue.empty()
+
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+import math
+
+import pytest
+
+from gym.common import info
+from gym.common.messages import Evaluation
+
+
+def evaluation():
+    ev = Evaluation(id=1)
+    ev.set("metrics", [{"name": "rtt", "value": float("nan")},
+                       {"name": "jitter", "value": [1.5, float("inf"), -float("inf")]}])
+    return ev
+
+
+@pytest.mark.parametrize("orjson", [info.orjson, None])
+def test_dumps_non_finite_as_null(monkeypatch, orjson):
+    if orjson is None:
+        monkeypatch.setattr(info, "orjson", None)
+    data = info.dumps({"evaluation": evaluation()})
+    assert "NaN" not in data and "Infinity" not in data
+    metrics = info.loads(data)["evaluation"]["result"]["metrics"]
+    assert metrics[0]["value"] is None
+    assert metrics[1]["value"] == [1.5, None, None]
+
+
+def test_dumps_same_output_with_and_without_orjson(monkeypatch):
+    if info.orjson is None:
+        pytest.skip("orjson not available")
+    data = {"evaluation": evaluation(), "values": {"a": 1, "b": [0.25, "x", None, True]}}
+    fast = info.dumps(data)
+    monkeypatch.setattr(info, "orjson", None)
+    assert info.dumps(data) == fast
+
+
+@pytest.mark.parametrize("orjson", [info.orjson, None])
+def test_loads_non_finite_from_older_peers(monkeypatch, orjson):
+    if orjson is None:
+        monkeypatch.setattr(info, "orjson", None)
+    assert info.loads('{"value": [NaN, Infinity, -Infinity, 1.0]}') == {"value": [None, None, None, 1.0]}
+    with pytest.raises(ValueError):
+        info.loads('{"value": ')
+    assert not math.isnan(info.loads(b'[0.5]')[0])
@@ -0,0 +1,108 @@
+import asyncio
+
+from gym.manager.manager import Manager, Tasks
+from gym.common.messages import Task, Snapshot, Ready
+
+
+def task(trials, parallel, task_id="7"):
+    msg = Task(id=task_id)
+    msg.set_prefix("100")
+    msg.set("trials", trials)
+    msg.set("parallel", parallel)
+    return msg
+
+
+def manager(agents, barrier=False):
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    mngr = Manager({"id": "manager", "url": "http://127.0.0.1:1"}, asyncio.Queue(), asyncio.Queue())
+    for agent_id in agents:
+        url = "http://127.0.0.1:%s" % agent_id
+        mngr.peers.hello({"url": url, "uuid": agent_id, "prefix": "2%s" % agent_id, "role": "agent"})
+        mngr.peers.info({"url": url, "uuid": agent_id, "role": "agent", "prefix": "2%s" % agent_id,
+                         "features": {"probers": {"1": {}}, "barrier": barrier}})
+    return mngr
+
+
+def outputs(mngr):
+    sent = []
+    while not mngr.out_q.empty():
+        sent.extend(mngr.out_q.get_nowait())
+    return sent
+
+
+def test_launch_parallel_trials():
+    tasks = Tasks()
+    msg = task(5, 2)
+    assert tasks.sched(msg)
+    assert not tasks.sched(msg)
+    assert tasks.launch(msg.get_id()) == [0, 1]
+    assert tasks.launch(msg.get_id()) == []
+
+    trial_task = tasks.trial_input(msg, 1)
+    assert tasks.ack(trial_task, ["snap"]) == msg.get_id()
+    assert tasks.launch(msg.get_id()) == [2]
+
+    for trial in [0, 2]:
+        tasks.ack(tasks.trial_input(msg, trial), [])
+    assert tasks.launch(msg.get_id()) == [3, 4]
+    for trial in [3, 4]:
+        tasks.ack(tasks.trial_input(msg, trial), [])
+    assert not tasks.next_trial(msg.get_id())
+    origin, pack = tasks.checkout(msg.get_id())
+    assert origin is msg
+    assert sorted(pack) == [0, 1, 2, 3, 4]
+
+
+def test_launch_single_trial():
+    tasks = Tasks()
+    msg = task(0, 0)
+    tasks.sched(msg)
+    assert tasks.launch(msg.get_id()) == [0]
+    assert tasks.launch(msg.get_id()) == []
+
+
+def test_parallel_trial_instruction_ids():
+    mngr = manager(["a1", "a2"])
+    msg = task(4, 4)
+    msg.set("agents", {"a1": [{"id": 1}], "a2": [{"id": 1}]})
+    mngr.task(msg)
+
+    instructions = outputs(mngr)
+    ids = [(inst.get_prefix(), inst.get_id()) for inst in instructions]
+    assert len(instructions) == 8
+    assert len(set(ids)) == 8
+
+    # each snapshot is routed back to its own trial
+    for inst in instructions:
+        snap = Snapshot(id=inst.get_id())
+        snap.sender("127.0.0.1", inst.get_prefix())
+        assert mngr.get_input_id(snap) == ("100", "7:%s" % inst.get("trial"))
+
+
+def test_barrier_released_when_all_ready():
+    mngr = manager(["a1", "a2"], barrier=True)
+    msg = task(2, 2)
+    msg.set("agents", {"a1": [{"id": 1}], "a2": [{"id": 1}]})
+    mngr.task(msg)
+    instructions = outputs(mngr)
+    assert all(inst.get("barrier") for inst in instructions)
+
+    def ready(inst):
+        msg = Ready(id=inst.get_id())
+        msg.sender("127.0.0.1", inst.get_prefix())
+        mngr.ready(msg)
+        return outputs(mngr)
+
+    trial_0 = [inst for inst in instructions if inst.get("trial") == 0]
+    trial_1 = [inst for inst in instructions if inst.get("trial") == 1]
+    assert ready(trial_0[0]) == []
+    assert ready(trial_1[0]) == []
+    # a repeated ready does not count for the other agent
+    assert ready(trial_0[0]) == []
+
+    releases = ready(trial_0[1])
+    assert sorted((rel.get_type(), rel.get_prefix(), rel.get_id()) for rel in releases) == \
+        sorted(("release", inst.get_prefix(), inst.get_id()) for inst in trial_0)
+    # released only once
+    assert ready(trial_0[1]) == []
+    assert len(ready(trial_1[1])) == 2
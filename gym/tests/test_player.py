@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+
+from gym.common.messages import Layout
+
+player = pytest.importorskip("gym.player.player")
+
+
+class FakeVNFBD:
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.count = 0
+
+    def get_id(self):
+        return "001"
+
+    def environment_deploy(self):
+        return False
+
+    def has_next_input(self):
+        return self.count < self.inputs
+
+    def next_input(self):
+        self.count += 1
+        return {"id": "instance-%s" % self.count, "test": self.count}
+
+    def instance(self, inputs):
+        return FakeInstance()
+
+
+class FakeInstance:
+    def set_id(self, instance_id):
+        self.id = instance_id
+
+    def get_id(self):
+        return self.id
+
+    def set_test_id(self, test):
+        pass
+
+    def ack_info(self):
+        pass
+
+
+def controller(managers, tasked):
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    ctrl = player.Controller("player", asyncio.Queue(), asyncio.Queue(), {"id": "player", "url": "http://127.0.0.1:1"})
+
+    def task(vnfbd_instance, structure=None):
+        ctrl.occupy(structure[0], vnfbd_instance)
+        tasked.append((structure[0], vnfbd_instance.get_id()))
+
+    ctrl.task = task
+    ctrl.assistants.managers = lambda: managers
+    ctrl.assistants.satisfy_structure = lambda instance, managers=None: (managers[0], {}) if managers else None
+    return ctrl
+
+
+def test_layout_before_managers_is_dispatched_on_info():
+    managers, tasked = {}, []
+    ctrl = controller(managers, tasked)
+    vnfbd = FakeVNFBD(3)
+    ctrl._vnfbds[vnfbd.get_id()] = vnfbd
+
+    ctrl.check(vnfbd)
+    assert tasked == []
+
+    managers.update({"m1": {}, "m2": {}})
+    ctrl.follow()
+    ctrl.resume()
+    assert tasked == [("m1", "instance-1"), ("m2", "instance-2")]
+
+    # busy managers are not tasked again
+    ctrl.follow()
+    ctrl.resume()
+    assert len(tasked) == 2
+
+    ctrl.vacate("instance-1")
+    ctrl.check(vnfbd)
+    assert tasked[-1] == ("m1", "instance-3")
+
+
+def layout(vnfbd_id, priority=None):
+    msg = Layout()
+    msg.set("vnf_bd", {"id": vnfbd_id})
+    if priority is not None:
+        msg.set("priority", priority)
+    msg.set_prefix("prefix-%s" % vnfbd_id)
+    return msg
+
+
+def test_layouts_dedup_limit_and_priority():
+    layouts = player.Layouts(limit=3)
+    assert layouts.put(layout("001"))
+    assert layouts.put(layout("002", 5))
+    assert not layouts.put(layout("001"))
+    assert layouts.put(layout("003"))
+    assert not layouts.put(layout("004"))
+    assert layouts.depth() == 3
+
+    assert [layouts.get().get("vnf_bd")["id"] for _ in range(3)] == ["002", "001", "003"]
+    assert layouts.get() is None
+
+    # a running layout is still known until it is done
+    assert not layouts.put(layout("003"))
+    layouts.done(layout("003"))
+    assert layouts.put(layout("003"))
+
+    metrics = layouts.metrics()
+    assert metrics["admitted"] == 4 and metrics["rejected"] == 1
+    assert metrics["duplicated"] == 2 and metrics["done"] == 1
+    assert metrics["depth"] == 1 and metrics["limit"] == 3
+
+
+def test_layouts_persisted_queue(tmp_path):
+    filepath = str(tmp_path / "layouts.json")
+    layouts = player.Layouts(filepath)
+    layouts.put(layout("001"))
+    layouts.put(layout("002", 5))
+    layouts.put(layout("003"))
+    running = layouts.get()
+    layouts.get()
+    layouts.done(running)
+
+    # the layout running when the player stopped is queued again, in its place
+    reloaded = player.Layouts(filepath)
+    assert reloaded.depth() == 2
+    first = reloaded.get()
+    assert first.get("vnf_bd") == {"id": "001"}
+    assert first.get_prefix() == "prefix-001"
+    assert reloaded.get().get("vnf_bd") == {"id": "003"}
+    assert reloaded.put(layout("004"))
+    assert not reloaded.put(layout("001"))
+
+
+def test_player_queue_file_is_opt_in(tmp_path):
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    info = {"id": "player", "url": "http://127.0.0.1:1", "storage": []}
+    ply = player.Player(info, asyncio.Queue(), asyncio.Queue())
+    ply.layouts.put(layout("001"))
+    assert ply.layouts._filepath is None
+
+    filepath = str(tmp_path / "layouts.json")
+    info["queue_file"] = filepath
+    ply = player.Player(info, asyncio.Queue(), asyncio.Queue())
+    ply.layouts.put(layout("001"))
+    assert player.Player(info, asyncio.Queue(), asyncio.Queue()).layouts.depth() == 1
+
+
+class FakeVNFBR:
+    def __init__(self, layout_id):
+        self.attribs = {}
+
+    def set_attrib(self, name, value):
+        self.attribs[name] = value
+
+    def to_json(self):
+        return "{}"
+
+    def compile(self):
+        pass
+
+
+def test_unsatisfied_inputs_end_layout_with_error(monkeypatch):
+    managers, tasked = {"m1": {}}, []
+    ctrl = controller(managers, tasked)
+    ctrl.assistants.satisfy_structure = lambda instance, managers=None: \
+        (managers[0], {}) if managers and instance.get_id() != "instance-2" else None
+    finished = []
+    ctrl.finish = finished.append
+    vnfbd = FakeVNFBD(3)
+    ctrl._vnfbds[vnfbd.get_id()] = vnfbd
+
+    ctrl.check(vnfbd)
+    assert tasked == [("m1", "instance-1")]
+    ctrl.vacate("instance-1")
+    ctrl.check(vnfbd)
+    # instance-2 is not dropped silently, instance-3 still runs
+    assert tasked[-1] == ("m1", "instance-3")
+    assert ctrl._unsatisfied == {"001": ["instance-2"]}
+    assert finished == []
+    ctrl.vacate("instance-3")
+    ctrl.check(vnfbd)
+    assert finished == [vnfbd]
+
+    results = []
+    monkeypatch.setattr(player, "VNFBR", FakeVNFBR)
+    ctrl.send_event = lambda ev: results.append(ev.result)
+    ctrl.clean = lambda vnfbd: None
+    ctrl._vnfbd_layout[vnfbd.get_id()] = layout("001")
+    ctrl.vnfbr(vnfbd, None)
+    error = results[0].get("error")
+    assert error.get("data") == ["instance-2"]
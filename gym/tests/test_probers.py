@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from gym.agent.probers import prober_ping
+from gym.agent.probers.prober_ping import ProberPing
+from gym.agent.probers.prober_iperf3 import ProberIperf3
+
+
+PROBERS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "probers")
+
+
+def ping(count):
+    prober = ProberPing()
+    for seq in range(count):
+        prober.feed("64 bytes from 10.0.0.1: icmp_seq=%s ttl=64 time=%s ms" % (seq, seq / 1000.0))
+    return prober
+
+
+def metrics_of(metrics):
+    return dict((metric["name"], metric["value"]) for metric in metrics)
+
+
+def metrics(prober):
+    return metrics_of(prober.series())
+
+
+def test_ping_percentiles():
+    values = metrics(ping(1001))
+    assert values["rtt_p50"] == 0.5
+    assert values["rtt_p90"] == 0.9
+    assert abs(values["rtt_p999"] - 0.999) < 1e-9
+
+
+def test_ping_percentiles_without_numpy(monkeypatch):
+    prober = ping(1001)
+    expected = prober.percentiles()
+    monkeypatch.setattr(prober_ping, "numpy", None)
+    for value, fallback in zip(expected, prober.percentiles()):
+        assert abs(value - fallback) < 1e-9
+
+
+def test_ping_series_is_capped():
+    prober = ping(25000)
+    rtts = metrics(prober)["rtt"]
+    assert len(rtts) <= ProberPing.SERIES_MAX
+    assert rtts[:2] == [0.0, 0.003]
+
+    opts = prober._launcher.parse_args(["--target", "10.0.0.1", "--series_max", "100"])
+    cmd, _, _ = prober.options(opts)
+    assert "series_max" not in cmd
+    assert len(metrics(prober)["rtt"]) == 100
+    assert len(metrics(ping(50))["rtt"]) == 50
+
+
+PING = """PING 10.0.0.1 (10.0.0.1) 56(84) bytes of data.
+64 bytes from 10.0.0.1: icmp_seq=1 ttl=64 time=0.045 ms
+64 bytes from 10.0.0.1: icmp_seq=2 ttl=64 time=0.051 ms
+64 bytes from 10.0.0.1: icmp_seq=3 ttl=64 time=0.062 ms
+
+--- 10.0.0.1 ping statistics ---
+3 packets transmitted, 3 received, 0% packet loss, time 2046ms
+rtt min/avg/max/mdev = 0.045/0.052/0.062/0.007 ms
+"""
+
+
+def test_ping_metrics_are_listed():
+    prober = ProberPing()
+    for line in PING.split("\n"):
+        prober.feed(line)
+    names = [metric["name"] for metric in prober.parser(PING)]
+    assert "rtt_p999" in names and "rtt" in names
+    assert set(names) <= set(ProberPing.METRICS)
+
+
+def iperf3(name):
+    with open(os.path.join(PROBERS, "iperf3-%s.json" % name)) as f:
+        return ProberIperf3().parser(f.read())
+
+
+def test_iperf3_parallel():
+    values = metrics_of(iperf3("parallel"))
+    assert values["bits_per_second"] == 8460000000 * 8 / 2.000051
+    assert values["received_bits_per_second"] == 8459000000 * 8 / 2.000051
+    assert values["interval_bits_per_second"] == [33840000000.0, 33840000000.0]
+    # cwnd of the parallel streams is summed per interval
+    assert values["interval_snd_cwnd"] == [2616600 * 2 + 12000] * 2
+    assert values["cpu_host_total"] == 87.412
+
+
+def test_iperf3_reverse():
+    values = metrics_of(iperf3("reverse"))
+    assert values["interval_bits_per_second"] == [4210000000 * 8.0] * 2
+    # the client only receives, so there is no sender side series
+    assert "interval_retransmits" not in values and "interval_snd_cwnd" not in values
+
+
+def test_iperf3_bidir():
+    values = metrics_of(iperf3("bidir"))
+    assert values["reverse_bits_per_second"] == 5900000000 * 8 / 2.000051
+    assert values["interval_bits_per_second"] == [3010000000 * 8.0] * 2
+    assert values["interval_reverse_bits_per_second"] == [2950000000 * 8.0] * 2
+    assert values["interval_snd_cwnd"] == [2621600] * 2
+
+
+@pytest.mark.parametrize("name", ["parallel", "reverse", "bidir"])
+def test_iperf3_metrics_are_listed(name):
+    assert set(metrics_of(iperf3(name))) <= set(ProberIperf3.METRICS)
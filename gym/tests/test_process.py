@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import threading
+
+import pytest
+
+from gym.common.process import Multiprocessor, AsyncActuator
+from gym.agent.probers.prober import Processor
+from gym.common.messages import Instruction, Action
+
+
+def running(pid):
+    try:
+        with open("/proc/%s/stat" % pid) as f:
+            # zombies were already killed, only their parent did not reap them
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except OSError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs /proc")
+def test_expired_process_kills_its_tool(tmp_path):
+    pidfile = tmp_path / "pid"
+    cmd = ["sh", "-c", "echo $$ > %s; exec sleep 30" % pidfile]
+    start = time.monotonic()
+    outputs = Multiprocessor().run({1: cmd}, deadline=1)
+    assert time.monotonic() - start < 10
+    assert outputs[1] == (-1, 'ERROR: process deadline expired')
+
+    pid = int(pidfile.read_text())
+    for _ in range(50):
+        if not running(pid):
+            break
+        time.sleep(0.1)
+    assert not running(pid)
+
+
+def test_run_within_deadline():
+    outputs = Multiprocessor().run({1: ["echo", "ok"]}, deadline=10)
+    assert outputs[1] == (0, "ok\n")
+
+
+def pid_killed(pidfile):
+    for _ in range(50):
+        if pidfile.exists() and pidfile.read_text().strip():
+            break
+        time.sleep(0.1)
+    pid = int(pidfile.read_text())
+    for _ in range(50):
+        if not running(pid):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class SleepAct:
+    def __init__(self):
+        self._processor = Processor()
+
+    def main(self, args):
+        self._processor.start_process(["sleep", "30"])
+        return "{}"
+
+
+def actuator(cfg):
+    act = AsyncActuator()
+    act._cfg = cfg
+    act.acts = {1: {"id": 1, "file": "sleep.py"}}
+    act._classes = {1: SleepAct}
+    return act
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="needs /proc")
+def test_async_spawn_deadline_kills_its_tool(tmp_path):
+    pidfile = tmp_path / "pid"
+    tool = tmp_path / "tool.sh"
+    tool.write_text("sleep 30 &\necho $! > %s\nwait\n" % pidfile)
+    act = actuator({"execution": "process", "deadline": 0.5})
+
+    start = time.monotonic()
+    ret, out = asyncio.run(act._spawn([str(tool)], act._deadline()))
+    assert time.monotonic() - start < 10
+    assert (ret, out) == (-1, 'ERROR: process deadline expired')
+    assert pid_killed(pidfile)
+
+
+def test_async_spawn_output_is_capped():
+    act = actuator({"execution": "process", "output_size": 1024})
+    assert asyncio.run(act._spawn(["head", "-c", "4096", "/dev/zero"])) == \
+        (-1, 'ERROR: process output exceeded 1024 bytes')
+    act = actuator({"execution": "process"})
+    assert asyncio.run(act._spawn(["echo", "ok"])) == (0, "ok\n")
+
+
+def test_pooled_act_deadline_stops_its_tool():
+    act = actuator({"execution": "pool", "deadline": 0.5, "workers": 1})
+    start = time.monotonic()
+    output = asyncio.run(act._exec({"id": 1, "parameters": {}}))
+    assert output == (None, 'ERROR: process deadline expired')
+    # the tool was killed, so the worker is free again
+    act._executor().shutdown(wait=True)
+    assert time.monotonic() - start < 10
+
+
+class ServerAct:
+    done = None
+
+    def listening(self, parameters):
+        return parameters.get("port")
+
+    def main(self, args):
+        # a server runs until its client is done
+        assert ServerAct.done.wait(5)
+        return '{"role": "server"}'
+
+
+class ClientAct(ServerAct):
+    def main(self, args):
+        ServerAct.done.set()
+        return '{"role": "client"}'
+
+
+def test_barrier_servers_do_not_hold_pool_workers():
+    ServerAct.done = threading.Event()
+    act = AsyncActuator()
+    act._cfg = {"execution": "pool", "workers": 1}
+    act.acts = {1: {"id": 1, "file": "server.py"}, 2: {"id": 2, "file": "client.py"}}
+    act._classes = {1: ServerAct, 2: ClientAct}
+
+    inst = Instruction()
+    for stimulus in [{"id": 1, "parameters": {"port": 5201}}, {"id": 1, "parameters": {"port": 5202}},
+                     {"id": 2, "parameters": {}}]:
+        action = Action()
+        action.set("stimulus", stimulus)
+        inst.add_action(action)
+
+    async def barrier(ports):
+        assert sorted(ports) == [5201, 5202]
+
+    start = time.monotonic()
+    evals = asyncio.run(act.act(inst, barrier=barrier))
+    assert time.monotonic() - start < 5
+    assert sorted(out["role"] for ack, _, out in evals.values() if ack) == ["client", "server", "server"]
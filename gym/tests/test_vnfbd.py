@@ -0,0 +1,157 @@
+import os
+import copy
+import json
+
+import pytest
+
+from gym.player.vnfbd import VNFBD, Scenario, Capabilities, TemplateCache
+
+
+LAYOUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "layouts", "layout-004.json")
+
+
+def ping(*inputs):
+    return {"id": 1, "name": "ping", "parameters": [{"input": name, "value": 1} for name in inputs]}
+
+
+def scenario(agents):
+    scn = Scenario()
+    scn.set_proceedings({"agents": agents, "monitors": []})
+    return scn
+
+
+def availables(agents):
+    return {"agents": [{"id": agent_id, "host": {}, "probers": {1: {"metrics": [], "parameters": params}}}
+                       for agent_id, params in agents.items()], "monitors": []}
+
+
+def test_match_competing_first_candidate():
+    # both requirements have ag1 as first candidate, only r2 requires it
+    scn = scenario([{"id": "r1", "probers": [ping("x")]}, {"id": "r2", "probers": [ping("x", "y")]}])
+    avail = availables({"ag1": ["x", "y"], "ag2": ["x"]})
+
+    selected = scn.satisfy(avail)["agents"]
+    assert set(selected) == {"ag1", "ag2"}
+    assert selected["ag1"][0]["parameters"] == {"x": 1, "y": 1}
+    assert selected["ag2"][0]["parameters"] == {"x": 1}
+
+
+def test_match_uses_capabilities_index():
+    scn = scenario([{"id": "r1", "probers": [ping("x")]}, {"id": "r2", "probers": [ping("x", "y")]}])
+    avail = availables({"ag1": ["x", "y"], "ag2": ["x"]})
+    capabilities = Capabilities.build(avail["agents"], "agents")
+    avail["capabilities"] = capabilities
+    assert set(scn.satisfy(avail)["agents"]) == {"ag1", "ag2"}
+
+    # ag1 loses "y", so r2 has no candidate left
+    capabilities.add("agents", "ag1", {1: {"parameters": ["x"]}})
+    assert scn.satisfy(avail) is None
+
+
+def test_match_mandatory_id():
+    scn = scenario([{"id": "ag2", "probers": [ping("x")]}, {"id": "r2", "probers": [ping("x")]}])
+    avail = availables({"ag1": ["x"], "ag2": ["x"]})
+    selected = scn.satisfy(avail)["agents"]
+    assert set(selected) == {"ag1", "ag2"}
+
+    # the only candidate of both requirements is ag2
+    scn = scenario([{"id": "ag2", "probers": [ping("x")]}, {"id": "r2", "probers": [ping("x", "y")]}])
+    avail = availables({"ag1": ["x"], "ag2": ["x", "y"]})
+    assert scn.satisfy(avail) is None
+
+
+def test_match_augmenting_path():
+    scn = Scenario()
+    # r1 takes a1 first and is moved to a2 so that r2 gets a1
+    assert scn._match({"r1": ["a1", "a2"], "r2": ["a1", "a2"]}) == {"r1": "a2", "r2": "a1"}
+    # required components with fewer candidates go first
+    candidates = {"r1": ["a1", "a2"], "r2": ["a2", "a3"], "r3": ["a1"]}
+    assert scn._match(candidates) == {"r1": "a2", "r2": "a3", "r3": "a1"}
+    assert scn._match({"r1": ["a1", "a2"], "r2": ["a1"], "r3": ["a1", "a2"]}) is None
+    assert scn._match({"r1": []}) is None
+    assert scn._match({}) == {}
+
+
+def test_template_cache_parse_copies():
+    cache = TemplateCache()
+    rendered = b"a: {b: [1, 2]}\n"
+    first = cache.parse(rendered)
+    first["a"]["b"].append(3)
+    second = cache.parse(rendered)
+    assert second == {"a": {"b": [1, 2]}}
+    second["a"]["c"] = True
+    assert cache.parse(rendered) == {"a": {"b": [1, 2]}}
+
+
+def eager_inputs(vnfbd, inputs, tests):
+    # inputs as they were built before mux_input, all at once
+    eager = []
+    for unique_input in vnfbd.mix_inputs(inputs):
+        for test in range(tests):
+            test_input = copy.deepcopy(unique_input)
+            test_input["test"] = test
+            eager.append(test_input)
+    return eager
+
+
+def test_mux_input_mixed_radix():
+    inputs = {"a": [1, 2, 3], "s": {"x": ["p", "q"], "y": 7, "z": {"w": [10, 20]}}, "k": "v"}
+    vnfbd = VNFBD()
+    vnfbd.experiments = {"tests": 2}
+    vnfbd.multiplex_parameters(inputs)
+    assert vnfbd._mux_total == 24
+
+    lazy = []
+    while vnfbd.has_next_input():
+        next_input = vnfbd.next_input()
+        assert next_input.pop("id") == 500 + len(lazy)
+        lazy.append(next_input)
+    assert lazy == eager_inputs(VNFBD(), inputs, 2)
+    assert vnfbd.mux_input(499) is None
+    assert vnfbd.mux_input(524) is None
+    # inputs of the vnf-bd are left untouched
+    assert inputs["a"] == [1, 2, 3]
+
+
+def test_mux_input_without_lists():
+    vnfbd = VNFBD()
+    vnfbd.experiments = {"tests": 1}
+    vnfbd.multiplex_parameters({"k": 1})
+    assert vnfbd.next_input() == {"k": 1, "test": 0, "id": 500}
+    assert not vnfbd.has_next_input()
+
+
+def layout_inputs():
+    with open(LAYOUT) as f:
+        inputs = json.load(f)["params"]["vnf_bd"]["inputs"]
+    # strings yaml would read as other types must come out of the patcher as they do from a full render
+    inputs["sut"]["resources"]["memory"] = [1024, 2048]
+    inputs["settings"]["duration"] = ["30", "60"]
+    inputs["sut"]["description"] = ["a VNF", "yes", "12", ""]
+    return inputs
+
+
+@pytest.mark.parametrize("patching", [True, False])
+def test_patched_instances_equal_full_renders(monkeypatch, patching):
+    monkeypatch.setattr(VNFBD, "PATCHING", patching)
+    inputs = layout_inputs()
+    vnfbd = VNFBD()
+    assert vnfbd.load("vnf-bd-004.yaml", inputs=inputs)
+    vnfbd.multiplex_parameters(inputs)
+    assert bool(vnfbd._patcher and vnfbd._patcher.ready) == patching
+    patched = []
+    if patching:
+        patch = vnfbd._patcher.patch
+        monkeypatch.setattr(vnfbd._patcher, "patch", lambda inputs: patched.append(patch(inputs)) or patched[-1])
+
+    count = 0
+    while vnfbd.has_next_input():
+        instance_inputs = vnfbd.next_input()
+        instance = vnfbd.instance(instance_inputs)
+        rendered = VNFBD()
+        assert rendered.load(vnfbd.filename(), inputs=instance_inputs)
+        assert instance.to_json() == rendered.to_json()
+        count += 1
+    assert count == vnfbd._mux_total == 192
+    if patching:
+        assert len(patched) == 192 and None not in patched
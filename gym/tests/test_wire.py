@@ -0,0 +1,81 @@
+import zlib
+import asyncio
+
+import pytest
+
+from gym.common import info
+from gym.common import wire
+from gym.common.messages import Message, Evaluation, Snapshot, rpc_map
+
+
+msgpack = pytest.importorskip("msgpack")
+
+
+def snapshot():
+    ev = Evaluation(id=1)
+    ev.set("metrics", [{"name": "rtt", "series": True, "unit": "ms", "value": [0.25, 1.5, 3.0]},
+                       {"name": "rtt_avg", "value": 1.5},
+                       {"name": "hops", "series": True, "value": ["a", "b"]}])
+    snap = Snapshot(id=2)
+    snap.set("evaluations", [ev])
+    snap.set("trial", 0)
+    return snap
+
+
+def test_series_packed_as_ext_type():
+    data = wire.pack({"snapshot": snapshot()})
+    raw = msgpack.unpackb(data, raw=False)
+    metrics = raw["snapshot"]["result"]["evaluations"][0]["result"]["metrics"]
+    assert isinstance(metrics[0]["value"], msgpack.ExtType)
+    assert metrics[0]["value"].code == wire.SERIES
+    assert len(metrics[0]["value"].data) == 3 * 8
+    # only lists of numbers are packed as series
+    assert metrics[1]["value"] == 1.5
+    assert metrics[2]["value"] == ["a", "b"]
+
+
+def test_pack_unpack_as_json():
+    content = {"snapshot": snapshot(), "ids": {1: "a", "b": [None, True]}}
+    unpacked = wire.unpack(wire.pack(content))
+    assert unpacked == info.loads(info.dumps(content))
+    metrics = unpacked["snapshot"]["result"]["evaluations"][0]["result"]["metrics"]
+    assert metrics[0]["value"] == [0.25, 1.5, 3.0]
+    assert list(unpacked["ids"]) == ["1", "b"]
+
+
+def test_message_round_trip():
+    snap = snapshot()
+    msg = Message.parse_dict(wire.unpack(wire.pack(snap)), rpc_map)
+    assert msg.get_type() == "snapshot"
+    assert msg.get_id() == snap.get_id()
+    # same message as a json peer would parse
+    assert info.dumps(msg) == info.dumps(Message.parse(info.dumps(snap), rpc_map))
+
+
+async def collect(chunks):
+    return [bytes(chunk) async for chunk in chunks]
+
+
+@pytest.mark.parametrize("encoding", [None, wire.GZIP, wire.ZSTD])
+def test_stream_round_trip(encoding):
+    if encoding == wire.ZSTD:
+        zstandard = pytest.importorskip("zstandard")
+    data = wire.pack({"snapshot": snapshot()}) * 2000
+    chunks = asyncio.run(collect(wire.stream(data, 4096, encoding)))
+    body = b"".join(chunks)
+    if encoding == wire.GZIP:
+        body = zlib.decompress(body, 31)
+    elif encoding == wire.ZSTD:
+        body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+    else:
+        assert max(len(chunk) for chunk in chunks) == 4096
+    assert body == data
+
+
+def test_feed_parses_as_data_arrives():
+    data = wire.pack({"snapshot": snapshot()})
+    unpacker = wire.unpacker(len(data))
+    for start in range(0, len(data) - 10, 10):
+        assert wire.feed(unpacker, data[start:start + 10]) is None
+    parsed = wire.feed(unpacker, data[start + 10:])
+    assert parsed == wire.unpack(data)